@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+import collections
+import io
+import multiprocessing
+import os
+import queue
+import tarfile
+import threading
+import time
+import traceback
+import zipfile
+
+import skimage.io
+
+import batch_manager
+import graph_converter
+import run
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+DATASET_EXTENSIONS = ('.bin', '.skg')
+
+
+def has_extension(path, extensions):
+    return path.lower().endswith(extensions)
+
+
+def iter_archive_images(path):
+    """
+    Streams the image members of a zip or tar archive, without unpacking it to the filesystem. Tar archives (also
+    compressed ones) are read sequentially.
+    :param path: Path to the archive
+    :return: Generator of (member name, file content as bytes), in archive order
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.filename.endswith('/') and batch_manager.is_image_file(info.filename):
+                    yield info.filename, archive.read(info)
+    else:
+        with tarfile.open(path, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and batch_manager.is_image_file(member.name):
+                    yield member.name, archive.extractfile(member).read()
+
+
+def decode_image(image_bytes):
+    return skimage.io.imread(io.BytesIO(image_bytes), as_grey=True)
+
+
+def prefetch(iterable, size, function=None):
+    """
+    Bounded prefetch reader: a background thread reads (and optionally decodes) the next items while the caller
+    computes, at most size items are held in memory
+    :param iterable: Iterable of (name, data)
+    :param size: Maximal number of prefetched items
+    :param function: Applied to data in the background thread (e.g. decode_image)
+    :return: Generator of (name, result, error): error is the traceback if reading or function failed for this item
+    """
+    items = queue.Queue(maxsize=max(1, size))
+    end = object()
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        try:
+            for name, data in iterable:
+                try:
+                    item = (name, function(data) if function else data, None)
+                except Exception:
+                    item = (name, None, traceback.format_exc())
+                if not put(item):
+                    return
+        except Exception:
+            put((None, None, traceback.format_exc()))
+        put(end)
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is end:
+                break
+            yield item
+    finally:
+        # The consumer stopped early: release the reader
+        stop.set()
+        thread.join()
+
+
+class GxlArchiveWriter(object):
+    """Writes graphs as GXL members (<image name>.gxl) into one zip or tar archive"""
+
+    def __init__(self, outfile, compact=False):
+        self.compact = compact
+        self.is_zip = has_extension(outfile, ('.zip',))
+        if self.is_zip:
+            self.archive = zipfile.ZipFile(outfile, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            mode = {'.gz': 'w:gz', '.tgz': 'w:gz', '.bz2': 'w:bz2', '.xz': 'w:xz'}.get(
+                os.path.splitext(outfile)[1].lower(), 'w')
+            self.archive = tarfile.open(outfile, mode)
+
+    def add(self, name, graph):
+        f = io.StringIO()
+        graph_converter.write_gxl(f, graph, os.path.basename(name), compact=self.compact)
+        data = f.getvalue().encode('utf-8')
+        member_name = '{}.gxl'.format(name)
+        if self.is_zip:
+            self.archive.writestr(member_name, data)
+        else:
+            info = tarfile.TarInfo(member_name)
+            info.size = len(data)
+            info.mtime = time.time()
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.archive.close()
+
+
+class DatasetWriter(object):
+    """Writes graphs as compact arrays into one binary dataset file (see graph_converter.DatasetFileWriter)"""
+
+    def __init__(self, outfile):
+        self.writer = graph_converter.DatasetFileWriter(outfile)
+
+    def add(self, name, graph):
+        self.writer.add(name, *graph_converter.graph_to_arrays(graph))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(outfile, compact=False):
+    """
+    :param outfile: .zip, .tar(.gz/.bz2/.xz) for GXL members or .bin/.skg for a binary dataset file
+    :return: GxlArchiveWriter or DatasetWriter
+    """
+    if has_extension(outfile, DATASET_EXTENSIONS):
+        return DatasetWriter(outfile)
+    if has_extension(outfile, ARCHIVE_EXTENSIONS):
+        return GxlArchiveWriter(outfile, compact=compact)
+    raise ValueError("outfile must end with one of {extensions} [outfile={outfile}]".format(
+        extensions=ARCHIVE_EXTENSIONS + DATASET_EXTENSIONS, outfile=outfile))
+
+
+def process_member(task):
+    """
+    Decodes an image and creates its graph (runs in the worker processes)
+    :param task: (name, image_bytes, params), params are passed on to run.image_to_graph, except for low_memory, which
+                 uses the workspace of the process (see batch_manager.process_workspace)
+    :return: (name, graph or None, error or None)
+    """
+    name, image_bytes, params = task
+    params = dict(params)
+    workspace = batch_manager.process_workspace() if params.pop('low_memory', False) else None
+    try:
+        _, graph = run.image_to_graph(decode_image(image_bytes), workspace=workspace, **params)
+        return name, graph, None
+    except Exception:
+        return name, None, traceback.format_exc()
+
+
+def result_of(item):
+    """Result of a pending pool task, or the item itself if it is already a result"""
+    return item if isinstance(item, tuple) else item.get()
+
+
+def process_archives(infiles, outfile, processes=1, prefetch_size=16, compact=False, **params):
+    """
+    Creates the graphs of all images in zip/tar archives and writes them into one output archive or dataset file
+    :param infiles: Paths to zip or tar archives
+    :param outfile: Output file, see open_writer
+    :param processes: Number of worker processes (1 = decode in a background thread, compute in this process)
+    :param prefetch_size: Number of images read ahead (per worker process with processes > 1)
+    :param compact: Write compact GXL (without indentation)
+    :param params: Parameters for run.image_to_graph (sigma1, sigma2, threshold, step_length, blur) and low_memory
+    :return: (results, summary): one result dict per image (infile, error) and a summary dict, see
+             batch_manager.summarize
+    """
+    def members():
+        for infile in infiles:
+            for name, data in iter_archive_images(infile):
+                yield '{}/{}'.format(os.path.basename(infile), name) if len(infiles) > 1 else name, data
+
+    writer = open_writer(outfile, compact=compact)
+    results = list()
+
+    def write(name, graph, error):
+        if error is None:
+            writer.add(name, graph)
+        results.append({'infile': name, 'outfile': outfile, 'error': error, 'cache': dict(), 'stages': list()})
+
+    start = time.time()
+    try:
+        if processes == 1:
+            params = dict(params)
+            workspace = batch_manager.process_workspace() if params.pop('low_memory', False) else None
+            for name, img, error in prefetch(members(), prefetch_size, decode_image):
+                graph = None
+                if error is None:
+                    try:
+                        _, graph = run.image_to_graph(img, workspace=workspace, **params)
+                    except Exception:
+                        error = traceback.format_exc()
+                write(name, graph, error)
+        else:
+            # Submit in archive order, at most prefetch_size images per worker in flight, write in archive order
+            with multiprocessing.Pool(processes) as pool:
+                pending = collections.deque()
+                for name, data, error in prefetch(members(), prefetch_size):
+                    if error is not None:
+                        pending.append((name, None, error))
+                    else:
+                        pending.append(pool.apply_async(process_member, ((name, data, params),)))
+                    if len(pending) >= processes * prefetch_size:
+                        write(*result_of(pending.popleft()))
+                while pending:
+                    write(*result_of(pending.popleft()))
+    finally:
+        writer.close()
+
+    return results, batch_manager.summarize(results, time.time() - start)
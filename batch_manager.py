@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+
+import glob
+import multiprocessing
+import os
+import time
+import traceback
+
+import binarize_manager
+import cache_manager
+import graph_manager
+import instrument_manager
+import manifest_manager
+import render_manager
+import run
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.gif')
+
+# Low-memory workspace and stage cache of this (worker) process, reused for all its images
+_workspace = None
+_cache = None
+
+
+def is_image_file(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def collect_inputs(inputs, list_files=()):
+    """
+    Expands input arguments to a list of image files
+    :param inputs: Directories (all image files in it), glob patterns or image files
+    :param list_files: Text files with one image path per line
+    :return: List of image paths (in the given order, without duplicates, also not of the same file given twice as
+             e.g. a.png and ./a.png)
+    """
+    paths = list()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(os.path.join(item, name) for name in os.listdir(item) if is_image_file(name)))
+        elif any(char in item for char in '*?['):
+            paths.extend(sorted(path for path in glob.glob(item, recursive=True) if os.path.isfile(path)))
+        else:
+            paths.append(item)
+
+    for list_file in list_files:
+        with open(list_file) as f:
+            paths.extend(line.strip() for line in f if line.strip())
+
+    seen = set()
+    return [path for path in paths if not (os.path.abspath(path) in seen or seen.add(os.path.abspath(path)))]
+
+
+def process_workspace():
+    """
+    :return: The binarize_manager.Workspace of this process
+    """
+    global _workspace
+    if _workspace is None:
+        _workspace = binarize_manager.Workspace()
+    return _workspace
+
+
+def input_root(infiles):
+    """
+    :return: The deepest directory that contains all input files (absolute path)
+    """
+    return os.path.commonpath([os.path.dirname(os.path.abspath(infile)) for infile in infiles])
+
+
+def process_cache(cache_dir, max_bytes):
+    """
+    :return: The cache_manager.StageCache of this process for cache_dir (keeps its running size total between images)
+    """
+    global _cache
+    if _cache is None or _cache.cache_dir != cache_dir or _cache.max_bytes != max_bytes:
+        _cache = cache_manager.StageCache(cache_dir, max_bytes=max_bytes)
+    return _cache
+
+
+def resolve_root(infiles, root=None, manifest_root=None):
+    """
+    Input root of a batch: the output names are the paths of the inputs below it
+    :param root: Root given by the user (None = manifest_root, or else the common directory of the inputs)
+    :param manifest_root: Root stored in the manifest of an incremental batch (None = no manifest)
+    :return: Absolute path of the root (None if there are no inputs and no root)
+    """
+    if root is not None:
+        root = os.path.abspath(root)
+        if manifest_root is not None and root != manifest_root:
+            raise ValueError("The manifest names the outputs relative to {manifest_root}, not {root}: use the same "
+                             "root or a new output directory".format(manifest_root=manifest_root, root=root))
+    else:
+        root = manifest_root or (input_root(infiles) if infiles else None)
+
+    for infile in infiles:
+        relative = os.path.relpath(os.path.abspath(infile), root)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            raise ValueError("{infile} is not below the input root {root}".format(infile=infile, root=root))
+    return root
+
+
+def gxl_path(infile, output_dir, root=None):
+    """
+    :param root: Input root (see resolve_root): the output keeps the path of the input below root, so that inputs with
+                 the same name in different directories (e.g. a/s.png and b/s.png) do not overwrite each other's
+                 outputs (None = only the file name)
+    :return: Path of the gxl-file of infile in output_dir
+    """
+    name = os.path.relpath(os.path.abspath(infile), root) if root is not None else os.path.basename(infile)
+    return os.path.join(output_dir, '{}.gxl'.format(name))
+
+
+def overlay_path(outfile):
+    return os.path.splitext(outfile)[0] + '.overlay.png'
+
+
+def process_image(task):
+    """
+    Creates the graph of one image and writes it as GXL. Errors are caught and returned, so that one broken image
+    does not stop the batch.
+    :param task: (infile, outfile, params) where params are passed on to run.create_graph_example, except for
+                 cache_dir and cache_bytes, which select the StageCache of the process (see process_cache), stats,
+                 which switches on the stage instrumentation (see instrument_manager), stats_memory, which also
+                 traces the peak memory of the stages (see instrument_manager.with_peak_memory), low_memory, which
+                 uses the workspace of the process (see process_workspace), and overlay, which also writes the graph
+                 drawn over the image as <outfile without .gxl>.overlay.png (see render_manager)
+    :return: Result dict (infile, outfile, seconds, error, cache statistics, stage records)
+    """
+    infile, outfile, params = task
+    params = dict(params)
+    cache_dir = params.pop('cache_dir', None)
+    cache_bytes = params.pop('cache_bytes', 1 << 30)
+    stages = list()
+    instrument = stages.append if params.pop('stats', False) else None
+    if params.pop('stats_memory', False) and instrument is not None:
+        instrument = instrument_manager.with_peak_memory(instrument)
+    workspace = process_workspace() if params.pop('low_memory', False) else None
+    overlay = params.pop('overlay', False)
+
+    start = time.time()
+    error = None
+    cache = None
+    try:
+        cache = process_cache(cache_dir, cache_bytes) if cache_dir else None
+        if cache is not None:
+            # Statistics of this image only
+            cache.stats.clear()
+        img, _, _, list_of_paths, graph = run.create_graph_example(infile, cache=cache, instrument=instrument,
+                                                                   workspace=workspace, **params)
+        with instrument_manager.measure(instrument, 'write'):
+            graph_manager.write_graph_to_gxl(graph=graph, outfile=outfile)
+        if overlay:
+            with instrument_manager.measure(instrument, 'overlay'):
+                render_manager.save_overlay(overlay_path(outfile), img, list_of_paths)
+    except Exception:
+        error = traceback.format_exc()
+
+    return {'infile': infile, 'outfile': outfile, 'seconds': time.time() - start, 'error': error,
+            'cache': dict(cache.stats) if cache is not None else dict(), 'stages': stages}
+
+
+def process_batch(infiles, output_dir, processes=None, chunksize=None, incremental=False, root=None, **params):
+    """
+    Creates one GXL file per image in output_dir, spread over a pool of processes
+    :param infiles: List of image paths
+    :param output_dir: Output directory (created if needed)
+    :param processes: Number of worker processes (default: number of CPUs, 1 = no pool)
+    :param chunksize: Number of images per task submitted to a worker (default: about 4 chunks per worker)
+    :param incremental: Keep a manifest (see manifest_manager) in output_dir and only process images whose content,
+                        parameters or code version changed since the last run; the outputs of inputs that were deleted
+                        or are no longer passed are removed
+    :param root: Input root, the outputs keep the path of the inputs below it (see gxl_path); default: the root stored
+                 in the manifest of an incremental batch, or else the common directory of the inputs. The root of a
+                 manifest is kept for all later runs, so that the output names do not depend on which inputs are
+                 passed; another root raises a ValueError.
+    :param params: Parameters for run.create_graph_example (sigma1, sigma2, threshold, step_length, blur), the
+                   stage cache (cache_dir, cache_bytes), the instrumentation (stats, stats_memory), the low-memory mode
+                   (low_memory) and the overlay images (overlay)
+    :return: (results, summary): one result dict per processed image (see process_image) and a summary dict; the
+             outputs keep the directories of the inputs below the root (see gxl_path)
+    """
+    entries, manifest_root = manifest_manager.load_manifest(output_dir) if incremental else (None, None)
+    root = resolve_root(infiles, root=root, manifest_root=manifest_root)
+
+    os.makedirs(output_dir, exist_ok=True)
+    processes = processes or multiprocessing.cpu_count()
+    tasks = [(infile, gxl_path(infile, output_dir, root=root), params) for infile in infiles]
+    for directory in sorted({os.path.dirname(outfile) for _, outfile, _ in tasks}):
+        os.makedirs(directory, exist_ok=True)
+
+    skipped = list()
+    removed = list()
+    failed = list()
+    if incremental:
+        def outputs(outfile):
+            paths = [outfile, overlay_path(outfile)] if params.get('overlay') else [outfile]
+            return [os.path.relpath(path, output_dir) for path in paths]
+
+        todo, skipped, removed_keys, failed = manifest_manager.plan_batch(
+            [(infile, outfile, outputs(outfile)) for infile, outfile, _ in tasks], output_dir, entries,
+            manifest_manager.output_params(params), cache_manager.code_version())
+        removed = [entries[key]['input'] for key in removed_keys]
+        for key in removed_keys:
+            manifest_manager.remove_outputs(output_dir, entries.pop(key))
+        new_entries = {outfile: entry for _, outfile, entry in todo}
+        tasks = [(infile, outfile, params) for infile, outfile, _ in todo]
+
+    if not chunksize:
+        chunksize = max(1, len(tasks) // (processes * 4))
+
+    start = time.time()
+    if processes == 1:
+        results = [process_image(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = list(pool.imap_unordered(process_image, tasks, chunksize))
+    seconds = time.time() - start
+
+    # Inputs that could not even be checked against the manifest are reported like images that failed to process
+    results = [failed_result(infile, outfile, error) for infile, outfile, error in failed] + results
+
+    if incremental:
+        # Failed images are not recorded, they are processed again in the next run
+        for result in results:
+            if not result['error']:
+                entries[os.path.relpath(result['outfile'], output_dir)] = new_entries[result['outfile']]
+        manifest_manager.save_manifest(output_dir, entries, root)
+
+    return results, summarize(results, seconds, skipped=skipped, removed=removed)
+
+
+def failed_result(infile, outfile, error):
+    """Result dict (see process_image) of an image that was not processed because of error"""
+    return {'infile': infile, 'outfile': outfile, 'seconds': 0.0, 'error': error, 'cache': dict(), 'stages': list()}
+
+
+def summarize(results, seconds, skipped=(), removed=()):
+    failed = [result for result in results if result['error']]
+    cache_stats = dict()
+    for result in results:
+        for stage, counts in result['cache'].items():
+            stage_stats = cache_stats.setdefault(stage, {'hits': 0, 'misses': 0})
+            stage_stats['hits'] += counts['hits']
+            stage_stats['misses'] += counts['misses']
+
+    return {'images': len(results),
+            'succeeded': len(results) - len(failed),
+            'failed': len(failed),
+            'failed_files': [result['infile'] for result in failed],
+            'seconds': seconds,
+            'images_per_second': len(results) / seconds if seconds else 0.0,
+            'cache': cache_stats,
+            'skipped': len(skipped),
+            'skipped_files': list(skipped),
+            'removed': len(removed),
+            'removed_files': list(removed)}
+
+
+def write_stats(results, f):
+    """Writes the stage records of all images as json lines"""
+    write = instrument_manager.json_lines_writer(f)
+    for result in results:
+        for record in result['stages']:
+            write(dict(record, image=result['infile']))
+
+
+def print_summary(results, summary):
+    for result in results:
+        if result['error']:
+            print('Failed: {}'.format(result['infile']))
+            print(result['error'])
+
+    print('{images} images in {seconds:.1f}s ({images_per_second:.2f} images/s): '
+          '{succeeded} succeeded, {failed} failed'.format(**summary))
+    for stage, counts in sorted(summary['cache'].items()):
+        print('Cache {stage}: {hits} hits, {misses} misses'.format(stage=stage, **counts))
+    for removed_file in summary.get('removed_files', ()):
+        print('Removed outputs of input no longer in the batch: {}'.format(removed_file))
+    if summary.get('skipped') or summary.get('removed'):
+        print('Skipped {skipped} unchanged images, removed the outputs of {removed} images no longer in the '
+              'batch'.format(**summary))
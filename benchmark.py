@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.dom.minidom
+import xml.etree.cElementTree as ElementTree
+from collections import defaultdict
+
+import numpy as np
+import scipy.ndimage
+import skimage
+import skimage.draw
+import skimage.io
+
+import binarize_manager
+import graph_converter
+import graph_manager
+
+STAGES = ('imread', 'difference_of_gaussians', 'fix_small_holes', 'binary_to_skeleton', 'get_endpoints_and_junctions',
+          'skeleton_to_paths', 'create_graph_from_paths', 'save_graph_as_gxl')
+
+# Modules measured by the import benchmark, and heavy modules they must not import (they are loaded lazily)
+IMPORT_MODULES = ('run', 'graph_manager', 'graph_converter')
+LAZY_MODULES = ('matplotlib', 'networkx', 'scipy.signal')
+
+# Synthetic workloads: image sizes and stroke densities (Bezier strokes per 100 x 100 pixels)
+SYNTHETIC_SIZES = (256, 512, 1024, 2048)
+SYNTHETIC_DENSITIES = (0.5, 2.0)
+
+# Stages whose time must grow about linearly with the number of skeleton pixels (see scaling_exponents), and the
+# largest accepted exponent of the fit seconds ~ skeleton_pixels ** exponent
+SCALING_STAGES = ('get_endpoints_and_junctions', 'skeleton_to_paths')
+MAX_SCALING_EXPONENT = 1.3
+
+# Number of nodes of the chain graphs written by the GXL writer benchmark
+GXL_WRITER_SIZES = (1000, 10000, 50000)
+
+
+def synthetic_image(size, density, stroke_width=3, seed=0):
+    """
+    Grey image with random dark Bezier strokes, like handwriting on paper
+    :param size: Edge length in pixels
+    :param density: Strokes per 100 x 100 pixels
+    :param stroke_width: Width of the strokes in pixels
+    :param seed: Random seed (the same arguments give the same image)
+    :return: uint8 image
+    """
+    random = np.random.RandomState(seed)
+    ink = np.zeros((size, size), dtype=bool)
+    num_strokes = max(1, int(round(density * size * size / 10000.0)))
+    for _ in range(num_strokes):
+        r0, c0 = random.randint(0, size, 2)
+        r1, c1, r2, c2 = np.clip(np.array([r0, c0, r0, c0]) + random.randint(-60, 61, 4), 0, size - 1)
+        rr, cc = skimage.draw.bezier_curve(r0, c0, r1, c1, r2, c2, random.uniform(0.5, 3.0))
+        inside = (rr >= 0) & (rr < size) & (cc >= 0) & (cc < size)
+        ink[rr[inside], cc[inside]] = True
+    ink = scipy.ndimage.binary_dilation(ink, iterations=stroke_width // 2)
+
+    img = np.full((size, size), 230, dtype=np.uint8)
+    img[ink] = 40
+    return img
+
+
+def workloads(image_dir, sizes=SYNTHETIC_SIZES, densities=SYNTHETIC_DENSITIES, tmp_dir=None):
+    """
+    :return: Generator of (workload name, path to the image file, stroke density or None for the image_dir images)
+    """
+    for path in sorted(glob.glob(os.path.join(image_dir, '*.png'))):
+        yield os.path.basename(path), path, None
+
+    for size in sizes:
+        for density in densities:
+            path = os.path.join(tmp_dir, 'synthetic_{}_{}.png'.format(size, density))
+            skimage.io.imsave(path, synthetic_image(size, density))
+            yield 'synthetic_{}x{}_d{}'.format(size, size, density), path, density
+
+
+def measure(function, repeat):
+    """
+    Runs a function several times
+    :return: (result, best wall time in seconds, peak traced memory in bytes during one run)
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def benchmark_image(path, tmp_dir, sigma1=1, sigma2=30, threshold=0.87, step_length=10, repeat=3):
+    """
+    Times and memory-profiles every stage of the pipeline on one image
+    :return: Dict stage -> {'seconds': best wall time, 'peak_bytes': peak memory, 'shape': image shape,
+             'skeleton_pixels': number of skeleton pixels}
+    """
+    results = dict()
+
+    def run_stage(stage, function):
+        result, seconds, peak = measure(function, repeat)
+        results[stage] = {'seconds': seconds, 'peak_bytes': peak}
+        return result
+
+    def read_image():
+        with open(path, "rb") as f_in:
+            return skimage.io.imread(f_in, as_grey=True)
+
+    img = run_stage('imread', read_image)
+    shape = list(img.shape)
+    dog = run_stage('difference_of_gaussians', lambda: binarize_manager.difference_of_gaussians(img, sigma1, sigma2))
+    binary_image = binarize_manager.apply_threshold(binarize_manager.invert_image(dog), threshold)
+    binary_image = run_stage('fix_small_holes', lambda: binarize_manager.fix_small_holes(binary_image))
+    skeleton = run_stage('binary_to_skeleton', lambda: binarize_manager.binary_to_skeleton(binary_image))
+    run_stage('get_endpoints_and_junctions', lambda: graph_manager.get_endpoints_and_junctions(skeleton))
+    list_of_paths = run_stage('skeleton_to_paths', lambda: graph_manager.skeleton_to_paths(skeleton, step_length))
+    graph = run_stage('create_graph_from_paths', lambda: graph_manager.create_graph_from_paths(list_of_paths))
+    outfile = os.path.join(tmp_dir, 'benchmark.gxl')
+    run_stage('save_graph_as_gxl', lambda: graph_converter.save_graph_as_gxl(graph, outfile, 'benchmark'))
+
+    skeleton_pixels = int(np.count_nonzero(skeleton == 0))
+    for stage_result in results.values():
+        stage_result['shape'] = shape
+        stage_result['skeleton_pixels'] = skeleton_pixels
+    return results
+
+
+def scaling_exponents(results, stages=SCALING_STAGES):
+    """
+    Fits seconds ~ skeleton_pixels ** exponent (least squares in log-log) over the synthetic workloads of the same
+    density, e.g. 1.0 for linear and 2.0 for quadratic behaviour
+    :param results: Result list of run_benchmarks
+    :return: List of dicts (stage, density, exponent, sizes = number of workloads in the fit)
+    """
+    exponents = list()
+    densities = sorted({result['density'] for result in results if result.get('density') is not None})
+    for stage in stages:
+        for density in densities:
+            rows = [result for result in results
+                    if result['stage'] == stage and result.get('density') == density and result['seconds'] > 0]
+            if len(rows) < 2:
+                continue
+            pixels = np.log([row['skeleton_pixels'] for row in rows])
+            seconds = np.log([row['seconds'] for row in rows])
+            exponent = np.polyfit(pixels, seconds, 1)[0]
+            exponents.append({'stage': stage, 'density': density, 'exponent': float(exponent), 'sizes': len(rows)})
+    return exponents
+
+
+def legacy_save_graph_as_gxl(nxgraph, outfile, graphname):
+    """
+    The former GXL writer (ElementTree, tostring, minidom reparse and pretty-print, DOCTYPE inserted by splitting into
+    lines), kept as the reference for graph_converter.save_graph_as_gxl: same output, byte for byte
+    """
+    root = ElementTree.Element("gxl")
+    graph = ElementTree.SubElement(root, "graph", edgeids="false", edgemode="undirected", id=graphname)
+
+    for attr_name, attr_value in nxgraph.graph.items():
+        a = ElementTree.SubElement(graph, "attr", name=attr_name)
+        ElementTree.SubElement(a, type(attr_value).__name__).text = str(attr_value)
+
+    for node_name, node_attr in nxgraph.node.items():
+        node = ElementTree.SubElement(graph, "node", id='{}_{}'.format(graphname, node_name))
+        x, y = node_attr['pos']
+        a = ElementTree.SubElement(node, "attr", name="x")
+        ElementTree.SubElement(a, "float").text = str(float(x))
+        a = ElementTree.SubElement(node, "attr", name="y")
+        ElementTree.SubElement(a, "float").text = str(float(y))
+        for attr_name, attr_value in node_attr.items():
+            if attr_name != 'pos':
+                a = ElementTree.SubElement(node, "attr", name=attr_name)
+                ElementTree.SubElement(a, "float").text = str(attr_value)
+
+    edges = defaultdict(list)
+    for e1 in nxgraph.edge:
+        for e2 in nxgraph.edge[e1]:
+            if e1 not in edges[e2]:
+                if e2 not in edges[e1]:
+                    edges[e1].append(e2)
+    for e1 in edges:
+        for e2 in edges[e1]:
+            ElementTree.SubElement(graph, "edge",
+                                   attrib={"from": '{}_{}'.format(graphname, e1), "to": '{}_{}'.format(graphname, e2)})
+
+    rough_string = ElementTree.tostring(root, 'utf-8')
+    pretty = xml.dom.minidom.parseString(rough_string).toprettyxml(indent="\t", encoding="UTF-8").decode("utf-8")
+    lines = pretty.split('\n')
+    lines.insert(1, graph_converter.GXL_DOCTYPE)
+    with open(outfile, "w") as f:
+        for line in lines:
+            f.write('{}\n'.format(line))
+
+
+def chain_graph(num_nodes):
+    """
+    :return: networkx graph of num_nodes nodes on a chain, with positions on rows of 1000 nodes
+    """
+    positions = [(index % 1000, index // 1000) for index in range(num_nodes)]
+    return graph_manager.create_graph_from_paths([[(y, x) for x, y in positions]])
+
+
+def benchmark_gxl_writers(tmp_dir, sizes=GXL_WRITER_SIZES, repeat=3):
+    """
+    Times and memory-profiles graph_converter.save_graph_as_gxl against the former writer (legacy_save_graph_as_gxl)
+    on chain graphs of growing size and checks that both write the same bytes
+    :return: List of result dicts (workload, stage, seconds, peak_bytes, identical)
+    """
+    results = list()
+    for num_nodes in sizes:
+        graph = chain_graph(num_nodes)
+        legacy_file = os.path.join(tmp_dir, 'legacy.gxl')
+        streaming_file = os.path.join(tmp_dir, 'streaming.gxl')
+        _, legacy_seconds, legacy_peak = measure(
+            lambda: legacy_save_graph_as_gxl(graph, legacy_file, 'chain'), repeat)
+        _, seconds, peak = measure(lambda: graph_converter.save_graph_as_gxl(graph, streaming_file, 'chain'), repeat)
+        with open(legacy_file, 'rb') as f_legacy, open(streaming_file, 'rb') as f_streaming:
+            identical = f_legacy.read() == f_streaming.read()
+
+        workload = 'gxl_chain_{}'.format(num_nodes)
+        results.append({'workload': workload, 'stage': 'save_graph_as_gxl_legacy', 'seconds': legacy_seconds,
+                        'peak_bytes': legacy_peak})
+        results.append({'workload': workload, 'stage': 'save_graph_as_gxl', 'seconds': seconds, 'peak_bytes': peak,
+                        'identical': identical})
+    return results
+
+
+def measure_import(module, repeat=3):
+    """
+    Import time of a module in a fresh interpreter
+    :return: (best wall time in seconds, list of LAZY_MODULES that were imported)
+    """
+    code = ('import json, sys, time\n'
+            'start = time.perf_counter()\n'
+            'import {module}\n'
+            'seconds = time.perf_counter() - start\n'
+            'print(json.dumps([seconds, [name for name in {lazy!r} if name in sys.modules]]))').format(
+        module=module, lazy=LAZY_MODULES)
+    best = None
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)))
+        seconds, loaded = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        best = seconds if best is None else min(best, seconds)
+    return best, loaded
+
+
+def run_benchmarks(image_dir, sizes=SYNTHETIC_SIZES, densities=SYNTHETIC_DENSITIES, gxl_sizes=GXL_WRITER_SIZES,
+                   repeat=3):
+    """
+    :return: Benchmark report (dict with 'environment' and 'results', one entry per workload and stage)
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='skeleton_graph_benchmark_')
+    results = list()
+    for module in IMPORT_MODULES:
+        seconds, loaded = measure_import(module, repeat=repeat)
+        results.append({'workload': 'import', 'stage': 'import_{}'.format(module), 'seconds': seconds,
+                        'peak_bytes': 0, 'lazy_modules_loaded': loaded})
+        print('{workload:30} {stage:28} {seconds:9.4f}s {loaded}'.format(
+            workload='import', stage=module, seconds=seconds, loaded=' '.join(loaded)))
+
+    try:
+        for name, path, density in workloads(image_dir, sizes=sizes, densities=densities, tmp_dir=tmp_dir):
+            for stage, stage_result in sorted(benchmark_image(path, tmp_dir, repeat=repeat).items(),
+                                              key=lambda item: STAGES.index(item[0])):
+                results.append(dict(workload=name, stage=stage, density=density, **stage_result))
+                print('{workload:30} {stage:28} {seconds:9.4f}s {peak_mb:9.1f} MiB'.format(
+                    workload=name, stage=stage, seconds=stage_result['seconds'],
+                    peak_mb=stage_result['peak_bytes'] / float(1 << 20)))
+
+        for result in benchmark_gxl_writers(tmp_dir, sizes=gxl_sizes, repeat=repeat):
+            results.append(result)
+            print('{workload:30} {stage:28} {seconds:9.4f}s {peak_mb:9.1f} MiB{note}'.format(
+                workload=result['workload'], stage=result['stage'], seconds=result['seconds'],
+                peak_mb=result['peak_bytes'] / float(1 << 20),
+                note='' if result.get('identical', True) else ' (different output)'))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    scaling = scaling_exponents(results)
+    for row in scaling:
+        print('{stage:28} density {density:4}: time ~ skeleton pixels ^ {exponent:.2f}'.format(**row))
+
+    environment = {'python': platform.python_version(), 'platform': platform.platform(),
+                   'numpy': np.__version__, 'skimage': skimage.__version__, 'repeat': repeat}
+    return {'environment': environment, 'results': results, 'scaling': scaling}
+
+
+def compare_to_baseline(report, baseline, tolerance=1.25):
+    """
+    Compares the timings and peak memory to a stored baseline report
+    :param tolerance: Factor by which a stage may be slower or use more memory before it counts as a regression
+    :return: List of regressions (dicts with workload, stage, metric, baseline, current, ratio)
+    """
+    baseline_results = {(result['workload'], result['stage']): result for result in baseline['results']}
+    regressions = list()
+    for result in report['results']:
+        old = baseline_results.get((result['workload'], result['stage']))
+        if old is None:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            ratio = result[metric] / old[metric] if old[metric] else 1.0
+            print('{workload:30} {stage:28} {metric:10} {ratio:6.2f}x'.format(
+                workload=result['workload'], stage=result['stage'], metric=metric, ratio=ratio))
+            if ratio > tolerance:
+                regressions.append({'workload': result['workload'], 'stage': result['stage'], 'metric': metric,
+                                    'baseline': old[metric], 'current': result[metric], 'ratio': ratio})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Skeleton Graph Benchmark')
+    parser.add_argument('-i', '--images', default='example_images',
+                        help='Directory with input images (default: example_images)', required=False)
+    parser.add_argument('-o', '--output', default='benchmark.json',
+                        help='Path to the json result file (default: benchmark.json)', required=False)
+    parser.add_argument('--baseline', help='Json result file of an earlier run to compare with', required=False)
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='Allowed slowdown/memory growth against the baseline (default: 1.25)', required=False)
+    parser.add_argument('-s', '--sizes', type=int, nargs='*', default=list(SYNTHETIC_SIZES),
+                        help='Edge lengths of the synthetic images', required=False)
+    parser.add_argument('--densities', type=float, nargs='*', default=list(SYNTHETIC_DENSITIES),
+                        help='Stroke densities of the synthetic images (strokes per 100x100 pixels)', required=False)
+    parser.add_argument('--gxl-sizes', type=int, nargs='*', default=list(GXL_WRITER_SIZES),
+                        help='Node counts of the chain graphs for the GXL writer benchmark', required=False)
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Number of timed runs per stage, the best is reported (default: 3)', required=False)
+    parser.add_argument('--max-exponent', type=float, default=MAX_SCALING_EXPONENT,
+                        help='Largest accepted scaling exponent of the path tracing stages in the number of skeleton '
+                             'pixels (default: {})'.format(MAX_SCALING_EXPONENT), required=False)
+
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.images, sizes=args.sizes, densities=args.densities, gxl_sizes=args.gxl_sizes,
+                            repeat=args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('Write results to "{}"'.format(args.output))
+
+    failed = False
+    for result in report['results']:
+        if result.get('lazy_modules_loaded'):
+            print('Regression: {stage} imports {modules} eagerly'.format(
+                stage=result['stage'], modules=', '.join(result['lazy_modules_loaded'])))
+            failed = True
+
+    for result in report['results']:
+        if result.get('identical') is False:
+            print('Regression: {stage} writes other bytes than the former writer ({workload})'.format(**result))
+            failed = True
+
+    for row in report['scaling']:
+        if row['exponent'] > args.max_exponent:
+            print('Regression: {stage} scales with skeleton pixels ^ {exponent:.2f} (density {density})'.format(**row))
+            failed = True
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, tolerance=args.tolerance)
+        for regression in regressions:
+            print('Regression: {workload} {stage} {metric} {baseline} -> {current} ({ratio:.2f}x)'.format(**regression))
+        failed = failed or bool(regressions)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
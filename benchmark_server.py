@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import server_manager
+
+
+def latency_summary(latencies, seconds):
+    """
+    :param latencies: Latency of every request in seconds
+    :param seconds: Wall time of all requests
+    :return: Dict with throughput and latency statistics
+    """
+    latencies = np.array(latencies)
+    return {'requests': len(latencies), 'seconds': seconds,
+            'requests_per_second': len(latencies) / seconds if seconds else 0.0,
+            'latency_mean': float(latencies.mean()), 'latency_p50': float(np.percentile(latencies, 50)),
+            'latency_p95': float(np.percentile(latencies, 95)), 'latency_max': float(latencies.max())}
+
+
+def run_concurrently(jobs, clients, function):
+    """
+    Runs function(job) for all jobs in client threads
+    :return: (latencies, wall time)
+    """
+    job_queue = queue.Queue()
+    for job in jobs:
+        job_queue.put(job)
+    latencies = list()
+    errors = list()
+
+    def client():
+        state = dict()
+        while True:
+            try:
+                job = job_queue.get_nowait()
+            except queue.Empty:
+                return
+            start = time.perf_counter()
+            try:
+                function(job, state)
+            except Exception as e:
+                errors.append(e)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    if errors:
+        raise errors[0]
+    return latencies, seconds
+
+
+def benchmark_cli(images, requests, clients, command, tmp_dir):
+    """One run.py process per image, as the upstream service did before"""
+    def convert(job, state):
+        index, path = job
+        outfile = os.path.join(tmp_dir, 'cli_{}.gxl'.format(index))
+        subprocess.check_call(command + ['-i', path, '-o', outfile], stdout=subprocess.DEVNULL)
+
+    jobs = [(index, images[index % len(images)]) for index in range(requests)]
+    return latency_summary(*run_concurrently(jobs, clients, convert))
+
+
+def benchmark_server(images, requests, clients, address, output_format):
+    """Requests to a running graph server, every client keeps its connection open"""
+    contents = list()
+    for path in images:
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+
+    def convert(job, state):
+        if 'connection' not in state:
+            state['connection'] = server_manager.connect(address)
+        server_manager.request_graph(state['connection'], job, format=output_format)
+
+    jobs = [contents[index % len(contents)] for index in range(requests)]
+    return latency_summary(*run_concurrently(jobs, clients, convert))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Skeleton Graph Server Benchmark')
+    parser.add_argument('-i', '--images', default='example_images',
+                        help='Directory with input images (default: example_images)', required=False)
+    parser.add_argument('-n', '--requests', type=int, default=40, help='Number of requests (default: 40)',
+                        required=False)
+    parser.add_argument('-c', '--clients', type=int, default=4, help='Number of concurrent clients (default: 4)',
+                        required=False)
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='Number of server worker processes (default: number of CPUs)', required=False)
+    parser.add_argument('-f', '--format', choices=sorted(server_manager.OUTPUT_FORMATS), default='gxl',
+                        help='Output format requested from the server (default: gxl)', required=False)
+    parser.add_argument('--cli', default='{} run.py'.format(sys.executable),
+                        help='Command line of the per-process CLI (default: "python run.py")', required=False)
+    parser.add_argument('-o', '--output', help='Path to a json result file', required=False)
+
+    args = parser.parse_args()
+
+    images = sorted(glob.glob(os.path.join(args.images, '*.png')))
+    if not images:
+        print('No input images found in "{}".'.format(args.images))
+        exit()
+
+    tmp_dir = tempfile.mkdtemp(prefix='skeleton_graph_server_benchmark_')
+    socket_path = os.path.join(tmp_dir, 'server.sock')
+    server = server_manager.create_server(socket_path=socket_path, processes=args.processes, quiet=True)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.start()
+    try:
+        # Warm up the workers
+        benchmark_server(images, server.stats['processes'], server.stats['processes'], socket_path, args.format)
+        report = {'server': benchmark_server(images, args.requests, args.clients, socket_path, args.format),
+                  'cli': benchmark_cli(images, args.requests, args.clients, args.cli.split(), tmp_dir),
+                  'clients': args.clients, 'processes': server.stats['processes'], 'format': args.format}
+    finally:
+        server.shutdown()
+        server.server_close()
+        server_thread.join()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for mode in ('cli', 'server'):
+        print('{mode:7} {requests_per_second:7.2f} requests/s, latency mean {latency_mean:.3f}s, '
+              'p50 {latency_p50:.3f}s, p95 {latency_p95:.3f}s'.format(mode=mode, **report[mode]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print('Write results to "{}"'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
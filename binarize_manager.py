@@ -5,27 +5,212 @@ import warnings
 
 import numpy as np
 import scipy
+import scipy.ndimage
 import scipy.ndimage.filters
-import scipy.signal
 import skimage
 import skimage.filters
 import skimage.io
 import skimage.morphology
 
+import neighbor_manager
 
-def difference_of_gaussians(img, sigma1, sigma2):
+
+BLUR_MODES = ('exact', 'fft', 'box')
+
+# Below this sigma the exact Gaussian kernel is small enough that the fast backends do not pay off
+FAST_BLUR_MIN_SIGMA = 3.0
+
+# Rows per band of the FFT blur into a preallocated image, see fft_blur_into
+FFT_BAND_ROWS = 512
+
+
+class Workspace(object):
+    """
+    Reusable buffers for the low-memory mode: the filtering runs in place on float32 (or float64) buffers, which grow to
+    the largest image and are reused for every following image, e.g. of a batch. The binary image and the skeleton are
+    returned as new bool/uint8 images, so they stay valid when the workspace is reused.
+    """
+
+    def __init__(self, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self.buffers = dict()
+
+    def buffer(self, name, shape):
+        """
+        :param name: Name of the buffer
+        :param shape: Shape of the image
+        :return: Uninitialized float image (a view of the buffer)
+        """
+        size = int(np.prod(shape))
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.size < size:
+            buffer = self.buffers[name] = np.empty(size, dtype=self.dtype)
+        return buffer[:size].reshape(shape)
+
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+
+def box_widths(sigma, passes):
+    """
+    Widths of the box filters whose repeated application approximates a Gaussian
+    :param sigma: Sigma of the Gaussian to approximate
+    :param passes: Number of box filter passes
+    :return: List of odd box widths (one per pass)
+    """
+    w_ideal = np.sqrt(12.0 * sigma * sigma / passes + 1.0)
+    w_lower = int(np.floor(w_ideal))
+    if w_lower % 2 == 0:
+        w_lower -= 1
+    w_upper = w_lower + 2
+    m = (12.0 * sigma * sigma - passes * w_lower * w_lower - 4.0 * passes * w_lower - 3.0 * passes)
+    m = int(round(m / (-4.0 * w_lower - 4.0)))
+    return [w_lower if i < m else w_upper for i in range(passes)]
+
+
+def blur_radius(sigma, blur='exact', passes=3):
+    """
+    Number of pixels in each direction that influence a pixel of the blurred image
+    :param sigma: Sigma for the Gaussian
+    :param blur: Blur backend, see gaussian_blur
+    :param passes: Number of box filter passes for blur='box'
+    :return: Radius in pixels
+    """
+    if blur == 'box' and sigma >= FAST_BLUR_MIN_SIGMA:
+        return sum(width // 2 for width in box_widths(sigma, passes))
+    # skimage/scipy truncate the kernel at 4 sigma
+    return int(4.0 * sigma + 0.5)
+
+
+def gaussian_blur(img, sigma, blur='exact', passes=3):
+    """
+    Gaussian blur with a selectable backend
+    :param img: Image object
+    :param sigma: Sigma for the Gaussian
+    :param blur: 'exact' (skimage), 'fft' (FFT convolution with the same kernel) or 'box' (stacked box filters)
+    :param passes: Number of box filter passes for blur='box' (more passes are closer to the exact Gaussian)
+    :return: Blurred image object
+    """
+    if blur == 'exact' or sigma < FAST_BLUR_MIN_SIGMA:
+        return skimage.filters.gaussian(img, sigma)
+
+    img = skimage.img_as_float(img)
+    if blur == 'fft':
+        radius, kernel = gaussian_kernel(sigma)
+        padded = np.pad(img, radius, mode='edge')
+        # Slow to import and only needed here. Imported under its own name: binding scipy locally would hide the global
+        # scipy module from the other branches of this function
+        from scipy.signal import fftconvolve
+        return fftconvolve(padded, kernel, mode='valid')
+
+    if blur == 'box':
+        if (not passes) or (passes < 1):
+            raise ValueError("passes must be a positive integer [passes={passes}]".format(passes=passes))
+        result = img
+        for width in box_widths(sigma, passes):
+            result = scipy.ndimage.uniform_filter(result, size=width, mode='nearest')
+        return result
+
+    raise ValueError("blur must be one of {modes} [blur={blur}]".format(modes=BLUR_MODES, blur=blur))
+
+
+def gaussian_blur_into(img, out, sigma, blur='exact', passes=3):
+    """
+    Gaussian blur of a float image into a preallocated image (out may be img for an in-place blur), same results as
+    gaussian_blur for the 'exact' and 'box' backends
+    :return: out
+    """
+    if blur == 'exact' or sigma < FAST_BLUR_MIN_SIGMA:
+        # skimage.filters.gaussian uses the same filter (mode='nearest', truncate=4.0)
+        return scipy.ndimage.gaussian_filter(img, sigma, output=out, mode='nearest', truncate=4.0)
+
+    if blur == 'box':
+        if (not passes) or (passes < 1):
+            raise ValueError("passes must be a positive integer [passes={passes}]".format(passes=passes))
+        for width in box_widths(sigma, passes):
+            scipy.ndimage.uniform_filter(img, size=width, output=out, mode='nearest')
+            img = out
+        return out
+
+    return fft_blur_into(img, out, sigma)
+
+
+def gaussian_kernel(sigma):
+    """
+    Same kernel and border handling as skimage/scipy: truncate=4.0, mode='nearest'
+    :return: (radius, 2D kernel of shape (2 * radius + 1, 2 * radius + 1))
+    """
+    radius = int(4.0 * sigma + 0.5)
+    x = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (x / float(sigma)) ** 2)
+    kernel /= kernel.sum()
+    return radius, np.outer(kernel, kernel)
+
+
+def fft_blur_into(img, out, sigma, band_rows=FFT_BAND_ROWS):
+    """
+    FFT Gaussian blur (see gaussian_blur) into a preallocated image, band by band of rows: the float64 and complex
+    temporaries of the FFT only have the size of a band plus the kernel radius, not of the image
+    :param out: Output image, may be img for an in-place blur
+    :param band_rows: Number of output rows per band
+    :return: out
+    """
+    from scipy.signal import fftconvolve
+
+    radius, kernel = gaussian_kernel(sigma)
+    height = img.shape[0]
+    # Input rows above the current band (edge rows above the image); copied, because out may overwrite them
+    above = img[np.zeros(radius, dtype=np.intp)]
+    for y0 in range(0, height, band_rows):
+        y1 = min(y0 + band_rows, height)
+        below = np.clip(np.arange(y1, y1 + radius), 0, height - 1)
+        band = np.concatenate((above, img[y0:y1], img[below]))
+        band = skimage.img_as_float(band).astype(np.float64, copy=False)
+        padded = np.pad(band, ((0, 0), (radius, radius)), mode='edge')
+        above = band[len(band) - 2 * radius:len(band) - radius].copy()
+        out[y0:y1] = fftconvolve(padded, kernel, mode='valid')
+    return out
+
+
+def difference_of_gaussians(img, sigma1, sigma2, blur='exact', passes=3):
     """
     Difference of Gaussians
     :param img: Image object
     :param sigma1: Sigma for first Gaussian
     :param sigma2: Sigma for second Gaussian
+    :param blur: Blur backend, see gaussian_blur
+    :param passes: Number of box filter passes for blur='box'
     :return: Image object (Gaussian2 - Gaussian1)
     """
-    blur1 = skimage.filters.gaussian(img, sigma1)
-    blur2 = skimage.filters.gaussian(img, sigma2)
+    blur1 = gaussian_blur(img, sigma1, blur=blur, passes=passes)
+    blur2 = gaussian_blur(img, sigma2, blur=blur, passes=passes)
     return blur2 - blur1
 
 
+def downsample(img, factor):
+    """
+    Reduces the resolution by averaging blocks of factor x factor pixels; the image is padded with its last row and
+    column to a multiple of factor
+    :param img: Grey image (integer images are scaled to [0, 1] like skimage.img_as_float)
+    :param factor: Integer reduction factor (1 = no change)
+    :return: Float image of shape ceil(shape / factor), pixel (i, j) covers the pixels [i * factor, (i + 1) * factor)
+    """
+    if factor < 1 or int(factor) != factor:
+        raise ValueError("factor must be a positive integer [factor={factor}]".format(factor=factor))
+    factor = int(factor)
+    if factor == 1:
+        return img
+
+    pad = [(0, -size % factor) for size in img.shape]
+    if any(after for _, after in pad):
+        img = np.pad(img, pad, mode='edge')
+    blocks = img.reshape(img.shape[0] // factor, factor, img.shape[1] // factor, factor)
+    reduced = blocks.mean(axis=(1, 3))
+    if img.dtype.kind in 'ui':
+        reduced /= np.iinfo(img.dtype).max
+    return reduced
+
+
 def invert_image(img):
     """
     Inverts an image object
@@ -39,25 +224,17 @@ def apply_threshold(img, threshold):
     return img > threshold
 
 
-def fix_small_holes(image):
-    fixed_image = np.copy(image)
-
-    a = invert_image(image)
-    b = np.matrix([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
-    c = scipy.signal.convolve2d(a, b, 'same')
-    # d = np.multiply(image, c)
+def fix_small_holes(image, in_place=False):
+    fixed_image = image if in_place else np.copy(image)
 
-    # for index, value in np.ndenumerate(d):
-    for index, value in np.ndenumerate(c):
-        if value >= 7:
-            fixed_image[index] = 0
-        if value <= 1:
-            fixed_image[index] = 1
+    neighbor_count = neighbor_manager.count_neighbors(np.logical_not(image))
+    fixed_image[neighbor_count >= 7] = 0
+    fixed_image[neighbor_count <= 1] = 1
 
     return fixed_image
 
 
-def img_to_binary(img, sigma1, sigma2, threshold):
+def img_to_binary(img, sigma1, sigma2, threshold, blur='exact', passes=3, workspace=None):
     if (not sigma1) or (sigma1 <= 0):
         raise ValueError("sigma1 must be a positive number [sigma1={sigma1}]".format(sigma1=sigma1))
     if (not sigma2) or (sigma2 <= 0):
@@ -66,18 +243,55 @@ def img_to_binary(img, sigma1, sigma2, threshold):
         raise ValueError(
             "threshold must be a number between 0.0 and 1.0 [threshold={threshold}]".format(threshold=threshold))
 
-    edge_image = invert_image(difference_of_gaussians(img, sigma1, sigma2))
+    if blur not in BLUR_MODES:
+        raise ValueError("blur must be one of {modes} [blur={blur}]".format(modes=BLUR_MODES, blur=blur))
+
+    if workspace is not None:
+        return img_to_binary_low_memory(img, sigma1, sigma2, threshold, workspace, blur=blur, passes=passes)
+
+    edge_image = invert_image(difference_of_gaussians(img, sigma1, sigma2, blur=blur, passes=passes))
     binary_image = apply_threshold(edge_image, threshold)
     return binary_image
 
 
+def img_to_binary_low_memory(img, sigma1, sigma2, threshold, workspace, blur='exact', passes=3):
+    """
+    img_to_binary with two float buffers of the workspace instead of about five float64 images
+    :param workspace: Workspace
+    :return: Binary image (bool)
+    """
+    image = workspace.buffer('image', img.shape)
+    if img.dtype.kind == 'u':
+        # Same scaling as skimage.img_as_float
+        np.multiply(img, 1.0 / np.iinfo(img.dtype).max, out=image, casting='unsafe')
+    else:
+        image[...] = img
+
+    blur1 = gaussian_blur_into(image, workspace.buffer('blur', img.shape), sigma1, blur=blur, passes=passes)
+    blur2 = gaussian_blur_into(image, image, sigma2, blur=blur, passes=passes)
+
+    # Edge image: 1 - (blur2 - blur1)
+    blur2 -= blur1
+    np.subtract(1, blur2, out=blur2)
+    return apply_threshold(blur2, threshold)
+
+
 def makedirs_for_file(path):
     dirname = os.path.dirname(path)
     if dirname:
         os.makedirs(dirname, exist_ok=True)
 
 
-def binary_to_skeleton(binary_image):
+def binary_to_skeleton(binary_image, low_memory=False):
+    """
+    :param low_memory: Return a uint8 skeleton and invert without integer copies (same values)
+    :return: Skeleton image (0 = black/skeleton, 1 = white)
+    """
+    if low_memory:
+        skeleton = skimage.morphology.skeletonize(np.logical_not(binary_image))
+        np.logical_not(skeleton, out=skeleton)
+        return skeleton.view(np.uint8)
+
     skeleton = invert_image(skimage.morphology.skeletonize(invert_image(binary_image)))
     return skeleton
 
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import defaultdict
+
+import numpy as np
+import scipy
+import skimage
+
+# Modules whose code determines the results of the pipeline, see code_version
+PIPELINE_MODULES = ('binarize_manager', 'graph_converter', 'graph_manager', 'keypoint_graph', 'neighbor_manager',
+                    'render_manager', 'run', 'spatial_index', 'tile_manager')
+
+# Fraction of max_bytes that StageCache.evict leaves, so that not every following store has to evict again
+EVICT_TO = 0.9
+
+_code_version = None
+
+
+def code_version():
+    """
+    Version tag of the pipeline: hash of the source of PIPELINE_MODULES and of the numpy, scipy and scikit-image
+    versions, so that cache entries and batch outputs are rebuilt after a change of the code or the libraries
+    :return: Hex string (computed once per process)
+    """
+    global _code_version
+    if _code_version is None:
+        sha = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for module in PIPELINE_MODULES:
+            with open(os.path.join(directory, '{}.py'.format(module)), 'rb') as f:
+                sha.update(f.read())
+        for library in (np, scipy, skimage):
+            sha.update(library.__version__.encode('utf-8'))
+        _code_version = sha.hexdigest()[:16]
+    return _code_version
+
+
+def hash_file(path, block_size=1 << 20):
+    """
+    Content hash of a file
+    :param path: Path to the file
+    :return: sha256 hex digest
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def encode_image(image):
+    """Bit-packs a binary image (e.g. binary image or skeleton)"""
+    return {'bits': np.packbits(np.asarray(image, dtype=bool)),
+            'shape': np.array(image.shape), 'dtype': np.array(image.dtype.str)}
+
+
+def decode_image(arrays):
+    shape = tuple(arrays['shape'])
+    bits = np.unpackbits(arrays['bits'])[:int(np.prod(shape))]
+    return bits.reshape(shape).astype(np.dtype(str(arrays['dtype'])))
+
+
+def encode_paths(list_of_paths):
+    """Stores a list of paths as one point array and the path lengths"""
+    points = np.array([point for path in list_of_paths for point in path], dtype=np.int32).reshape(-1, 2)
+    return {'points': points, 'lengths': np.array([len(path) for path in list_of_paths], dtype=np.int64)}
+
+
+def decode_paths(arrays):
+    points = [tuple(point) for point in arrays['points'].tolist()]
+    ends = np.cumsum(arrays['lengths']).tolist()
+    return [points[start:end] for start, end in zip([0] + ends[:-1], ends)]
+
+
+IMAGE_CODEC = (encode_image, decode_image)
+PATHS_CODEC = (encode_paths, decode_paths)
+
+
+def cached_stage(cache, stage, source, params, codec, compute):
+    """
+    Runs a pipeline stage through the cache, or directly if cache is None
+    :param cache: StageCache or None
+    :param stage: Stage name
+    :param source: Image content hash or the key of the previous stage
+    :param params: Dict of the stage parameters
+    :param codec: (encode, decode) functions, e.g. IMAGE_CODEC or PATHS_CODEC
+    :param compute: Function without arguments computing the stage result
+    :return: (key, result), key is None without cache
+    """
+    if cache is None:
+        return None, compute()
+    key = cache.key(stage, source, **params)
+    return key, cache.cached(stage, key, compute, codec)
+
+
+class StageCache(object):
+    """
+    On-disk cache for intermediate results of the pipeline (binary image, skeleton, paths)
+
+    Entries are compressed .npz files named by a hash of the stage, the image content hash, the stage parameters and
+    the code version. The least recently used entries are removed when the cache grows beyond max_bytes. The size of
+    the cache is a running total of the stored entries: the directory is only listed once and when the total exceeds
+    max_bytes (then the entries are removed down to EVICT_TO * max_bytes). Entries stored by other processes are
+    only counted at the next listing, so with several processes the cache can exceed max_bytes for a while.
+    """
+
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self.total_bytes = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(stage, source, **params):
+        """
+        :param stage: Stage name
+        :param source: Image content hash or the key of the previous stage
+        :param params: Parameters of the stage
+        :return: Cache key
+        """
+        description = json.dumps([stage, source, code_version(), sorted(params.items())])
+        return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, '{}.npz'.format(key))
+
+    def load(self, stage, key, decode):
+        path = self.path(key)
+        try:
+            with np.load(path) as arrays:
+                value = decode(arrays)
+        except (IOError, OSError, ValueError, KeyError):
+            self.stats[stage]['misses'] += 1
+            return None
+
+        # Mark as recently used
+        os.utime(path, None)
+        self.stats[stage]['hits'] += 1
+        return value
+
+    def store(self, key, arrays):
+        # Write to a temporary file first, so that concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+            size = f.tell()
+        path = self.path(key)
+        try:
+            size -= os.path.getsize(path)
+        except OSError:
+            pass
+        os.replace(tmp_path, path)
+
+        if self.total_bytes is None:
+            self.evict()
+        else:
+            self.total_bytes += size
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def cached(self, stage, key, compute, codec):
+        """
+        Loads a stage result from the cache or computes and stores it
+        :param stage: Stage name (for the statistics)
+        :param key: Cache key, see key()
+        :param compute: Function without arguments computing the stage result
+        :param codec: (encode, decode) functions, e.g. IMAGE_CODEC or PATHS_CODEC
+        :return: Stage result
+        """
+        encode, decode = codec
+        value = self.load(stage, key, decode)
+        if value is None:
+            value = compute()
+            self.store(key, encode(value))
+        return value
+
+    def evict(self):
+        """
+        Lists the cache directory and removes the least recently used entries if the cache is larger than max_bytes
+        (down to EVICT_TO * max_bytes)
+        """
+        entries = list()
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, name in sorted(entries):
+                if total <= EVICT_TO * self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+                total -= size
+        self.total_bytes = total
+
+    def report(self):
+        return ', '.join('{stage}: {hits} hits, {misses} misses'.format(stage=stage, **counts)
+                         for stage, counts in sorted(self.stats.items()))
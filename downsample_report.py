@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+import render_manager
+import run
+from spatial_index import SpatialIndex
+
+DOWNSAMPLE_FACTORS = (2, 3, 4)
+
+
+def nearest_distances(positions, reference_positions):
+    """
+    :return: Distance of every position to the nearest reference position (inf if there are no reference positions)
+    """
+    distances, _ = SpatialIndex(reference_positions).nearest(positions)
+    return distances[:, 0]
+
+
+def stroke_pixels(graph):
+    """
+    :return: (n, 2) array of the pixels on the edges and of the nodes of a graph, as (x, y)
+    """
+    positions = graph.positions.astype(float)
+    xs, ys = render_manager.segment_pixels(positions[graph.edges].reshape(-1, 2, 2))
+    return np.concatenate((np.stack((xs, ys), axis=1), graph.positions))
+
+
+def compare_graphs(graph, reference):
+    """
+    Compares a downsampled graph with the full-resolution reference graph of the same image
+    :return: Dict with node and edge counts and their ratios, the position error (distance of every node to the nearest
+             reference node: mean, 95th percentile, max), the stroke error (distance of every node to the nearest
+             edge of the reference, independent of where the strokes are sampled: mean, max) and the coverage (mean
+             distance of every reference node to the nearest node)
+    """
+    errors = nearest_distances(graph.positions, reference.positions)
+    stroke_errors = nearest_distances(graph.positions, stroke_pixels(reference))
+    coverage = nearest_distances(reference.positions, graph.positions)
+    return {'nodes': graph.number_of_nodes(), 'edges': graph.number_of_edges(),
+            'reference_nodes': reference.number_of_nodes(), 'reference_edges': reference.number_of_edges(),
+            'node_ratio': graph.number_of_nodes() / max(1, reference.number_of_nodes()),
+            'edge_ratio': graph.number_of_edges() / max(1, reference.number_of_edges()),
+            'error_mean': float(np.mean(errors)) if len(errors) else 0.0,
+            'error_p95': float(np.percentile(errors, 95)) if len(errors) else 0.0,
+            'error_max': float(np.max(errors)) if len(errors) else 0.0,
+            'stroke_error_mean': float(np.mean(stroke_errors)) if len(stroke_errors) else 0.0,
+            'stroke_error_max': float(np.max(stroke_errors)) if len(stroke_errors) else 0.0,
+            'coverage_mean': float(np.mean(coverage)) if len(coverage) else 0.0}
+
+
+def timed_graph(path, **params):
+    """
+    :return: (graph, wall time in seconds) of run.create_graph_example
+    """
+    start = time.perf_counter()
+    graph = run.create_graph_example(path, **params)[-1]
+    return graph, time.perf_counter() - start
+
+
+def report_image(path, factors=DOWNSAMPLE_FACTORS, **params):
+    """
+    :param params: Parameters for run.create_graph_example (sigma1, sigma2, threshold, step_length, blur)
+    :return: List of result dicts, one per factor (see compare_graphs, plus seconds and the full-resolution seconds)
+    """
+    reference, reference_seconds = timed_graph(path, **params)
+    results = list()
+    for factor in factors:
+        graph, seconds = timed_graph(path, downsample=factor, **params)
+        results.append(dict(compare_graphs(graph, reference), factor=factor, seconds=seconds,
+                            reference_seconds=reference_seconds))
+    return results
+
+
+def summarize(results):
+    """
+    :return: One dict per factor with the totals over all images: node and edge ratios, mean position and stroke
+             errors (over all nodes), worst 95th percentile of the position error and speedup
+    """
+    summary = list()
+    for factor in sorted({result['factor'] for result in results}):
+        rows = [result for result in results if result['factor'] == factor]
+
+        def total(name, weight=None):
+            return sum(row[name] * (row[weight] if weight else 1) for row in rows)
+
+        nodes = total('nodes')
+        summary.append({'factor': factor,
+                        'node_ratio': nodes / max(1, total('reference_nodes')),
+                        'edge_ratio': total('edges') / max(1, total('reference_edges')),
+                        'error_mean': total('error_mean', 'nodes') / max(1, nodes),
+                        'error_p95': max(row['error_p95'] for row in rows),
+                        'stroke_error_mean': total('stroke_error_mean', 'nodes') / max(1, nodes),
+                        'speedup': total('reference_seconds') / total('seconds')})
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Skeleton Graph Downsampling Report')
+    parser.add_argument('-i', '--images', default='example_images',
+                        help='Directory with input images (default: example_images)', required=False)
+    parser.add_argument('-f', '--factors', type=int, nargs='*', default=list(DOWNSAMPLE_FACTORS),
+                        help='Downsampling factors to compare with the full resolution (default: 2 3 4)',
+                        required=False)
+    parser.add_argument('-o', '--output', default='downsample_report.json',
+                        help='Path to the json result file (default: downsample_report.json)', required=False)
+    parser.add_argument('--step-length', type=int, default=10,
+                        help='Step length in pixels of the original image (default: 10)', required=False)
+
+    args = parser.parse_args()
+
+    results = list()
+    for path in sorted(glob.glob(os.path.join(args.images, '*.png'))):
+        for result in report_image(path, factors=args.factors, sigma1=1, sigma2=30, threshold=0.87,
+                                   step_length=args.step_length):
+            results.append(dict(result, image=os.path.basename(path)))
+            print('{image:20} x{factor} nodes {nodes:5}/{reference_nodes:5} edges {edges:5}/{reference_edges:5} '
+                  'error {error_mean:5.2f} p95 {error_p95:5.2f} max {error_max:6.2f} '
+                  'stroke {stroke_error_mean:5.2f} px  '
+                  '{seconds:6.3f}s/{reference_seconds:6.3f}s'.format(**results[-1]))
+
+    summary = summarize(results)
+    for row in summary:
+        print('x{factor}: nodes {node_ratio:.1%}, edges {edge_ratio:.1%}, mean error {error_mean:.2f} px, '
+              'worst p95 {error_p95:.2f} px, mean stroke error {stroke_error_mean:.2f} px, '
+              'speedup {speedup:.2f}x'.format(**row))
+
+    with open(args.output, 'w') as f:
+        json.dump({'step_length': args.step_length, 'results': results, 'summary': summary}, f, indent=2,
+                  sort_keys=True)
+    print('Write results to "{}"'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
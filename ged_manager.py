@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+import json
+import multiprocessing
+import os
+from collections import namedtuple
+
+import numpy as np
+import scipy.optimize
+import scipy.spatial.distance
+
+import graph_converter
+
+# Keypoint graph prepared for the edit distance: float (x, y) positions with shape (n, 2), every undirected edge once
+# as sorted node index pair with shape (m, 2), node degrees with shape (n,)
+PreparedGraph = namedtuple('PreparedGraph', ['positions', 'edges', 'degrees'])
+
+# Prepared row and column graphs and cost parameters of the distance matrix worker processes
+_worker_state = None
+
+
+def graph_arrays(graph):
+    """
+    :param graph: KeypointGraph, networkx graph (create_graph_from_paths, load_gxl_to_graph), GxlArrays
+                  (load_gxl_to_arrays) or a (positions, edges) tuple (e.g. from graph_converter.dataset_arrays)
+    :return: (positions, edges): float (x, y) positions with shape (n, 2), node index pairs with shape (m, 2)
+    """
+    if isinstance(graph, graph_converter.GxlArrays):
+        return graph.positions, graph.edges
+    if isinstance(graph, tuple):
+        return graph
+    return graph_converter.graph_to_arrays(graph)
+
+
+def prepare_graph(graph, normalize=True):
+    """
+    :param graph: Keypoint graph, see graph_arrays
+    :param normalize: Center the positions and scale them by their standard deviation (the same factor for x and y),
+                      so that the costs do not depend on the position and size of the handwriting
+    :return: PreparedGraph
+    """
+    positions, edges = graph_arrays(graph)
+    positions = np.array(positions, dtype=np.float64).reshape(-1, 2)
+    edges = np.sort(np.asarray(edges, dtype=np.intp).reshape(-1, 2), axis=1)
+    if len(edges):
+        edges = np.unique(edges, axis=0)
+    degrees = np.bincount(edges.ravel(), minlength=len(positions))
+
+    if normalize and len(positions):
+        positions -= positions.mean(axis=0)
+        scale = positions.std()
+        if scale > 0:
+            positions /= scale
+    return PreparedGraph(positions=positions, edges=edges, degrees=degrees)
+
+
+def cost_matrix(graph1, graph2, node_cost=1.0, edge_cost=1.0):
+    """
+    Bipartite cost matrix of the node edit operations (Riesen and Bunke): substitutions (Euclidean distance of the
+    positions) in the upper left, deletions and insertions on the diagonals of the upper right and lower left block.
+    The edge costs are estimated from the node degrees, every edge is shared by two nodes and counts half at each.
+    :param graph1: PreparedGraph with n nodes
+    :param graph2: PreparedGraph with m nodes
+    :param node_cost: Cost of a node deletion or insertion
+    :param edge_cost: Cost of an edge deletion or insertion
+    :return: Float array with shape (n + m, n + m)
+    """
+    n, m = len(graph1.positions), len(graph2.positions)
+    substitute = scipy.spatial.distance.cdist(graph1.positions, graph2.positions) if n and m else np.zeros((n, m))
+    substitute += 0.5 * edge_cost * np.abs(graph1.degrees[:, np.newaxis] - graph2.degrees[np.newaxis, :])
+    delete = node_cost + 0.5 * edge_cost * graph1.degrees
+    insert = node_cost + 0.5 * edge_cost * graph2.degrees
+
+    # Forbidden assignments get a finite cost above any complete assignment (older scipy does not accept inf)
+    forbidden = substitute.sum() + delete.sum() + insert.sum() + 1.0
+    costs = np.zeros((n + m, n + m))
+    costs[:n, :m] = substitute
+    costs[:n, m:] = forbidden
+    costs[np.arange(n), m + np.arange(n)] = delete
+    costs[n:, :m] = forbidden
+    costs[n + np.arange(m), np.arange(m)] = insert
+    return costs
+
+
+def node_assignment(graph1, graph2, node_cost=1.0, edge_cost=1.0):
+    """
+    Solves the bipartite node assignment with scipy.optimize.linear_sum_assignment
+    :return: Int array with shape (n,): node of graph2 that node i of graph1 is substituted with, -1 for deleted nodes
+    """
+    n, m = len(graph1.positions), len(graph2.positions)
+    mapping = np.full(n, -1, dtype=np.intp)
+    if n and m:
+        rows, cols = scipy.optimize.linear_sum_assignment(cost_matrix(graph1, graph2, node_cost, edge_cost))
+        substituted = (rows < n) & (cols < m)
+        mapping[rows[substituted]] = cols[substituted]
+    return mapping
+
+
+def edit_path_cost(graph1, graph2, mapping, node_cost=1.0, edge_cost=1.0):
+    """
+    Exact cost of the edit path induced by a node mapping: the substituted nodes cost their distance, the others
+    node_cost, edges whose end nodes are mapped onto an edge of graph2 are kept, all other edges cost edge_cost
+    :param mapping: See node_assignment
+    :return: Cost (float)
+    """
+    substituted = np.flatnonzero(mapping >= 0)
+    num_substituted = len(substituted)
+    cost = np.sqrt(((graph1.positions[substituted] - graph2.positions[mapping[substituted]]) ** 2).sum(axis=1)).sum()
+    cost += node_cost * (len(graph1.positions) + len(graph2.positions) - 2 * num_substituted)
+
+    mapped_edges = mapping[graph1.edges]
+    mapped_edges = np.sort(mapped_edges[(mapped_edges >= 0).all(axis=1)], axis=1)
+    num_nodes2 = len(graph2.positions)
+    kept = np.isin(mapped_edges[:, 0] * num_nodes2 + mapped_edges[:, 1],
+                   graph2.edges[:, 0] * num_nodes2 + graph2.edges[:, 1]).sum()
+    cost += edge_cost * (len(graph1.edges) + len(graph2.edges) - 2 * kept)
+    return float(cost)
+
+
+def prepared_distance(graph1, graph2, node_cost=1.0, edge_cost=1.0):
+    mapping = node_assignment(graph1, graph2, node_cost=node_cost, edge_cost=edge_cost)
+    return edit_path_cost(graph1, graph2, mapping, node_cost=node_cost, edge_cost=edge_cost)
+
+
+def graph_edit_distance(graph1, graph2, node_cost=1.0, edge_cost=1.0, normalize=True):
+    """
+    Approximate graph edit distance of two keypoint graphs (bipartite approximation, an upper bound of the exact
+    distance)
+    :param graph1: Keypoint graph, see graph_arrays
+    :param graph2: Keypoint graph, see graph_arrays
+    :param node_cost: Cost of a node deletion or insertion
+    :param edge_cost: Cost of an edge deletion or insertion
+    :param normalize: See prepare_graph
+    :return: Distance (float)
+    """
+    return prepared_distance(prepare_graph(graph1, normalize=normalize), prepare_graph(graph2, normalize=normalize),
+                             node_cost=node_cost, edge_cost=edge_cost)
+
+
+def matrix_blocks(num_rows, num_cols, block_size, upper_triangle=False):
+    """
+    :return: List of blocks (row_start, row_end, col_start, col_end), without the blocks below the diagonal in the
+             upper triangle mode
+    """
+    blocks = list()
+    for row_start in range(0, num_rows, block_size):
+        for col_start in range(0, num_cols, block_size):
+            col_end = min(col_start + block_size, num_cols)
+            if not upper_triangle or col_end - 1 > row_start:
+                blocks.append((row_start, min(row_start + block_size, num_rows), col_start, col_end))
+    return blocks
+
+
+def block_mask(block, upper_triangle=False):
+    """Entries of a block that are computed: all, or only those above the diagonal in the upper triangle mode"""
+    row_start, row_end, col_start, col_end = block
+    if not upper_triangle:
+        return np.ones((row_end - row_start, col_end - col_start), dtype=bool)
+    return np.arange(col_start, col_end)[np.newaxis, :] > np.arange(row_start, row_end)[:, np.newaxis]
+
+
+def init_worker(row_graphs, col_graphs, upper_triangle, node_cost, edge_cost):
+    global _worker_state
+    _worker_state = (row_graphs, col_graphs, upper_triangle, node_cost, edge_cost)
+
+
+def compute_block(block):
+    """
+    Computes one block of the distance matrix (runs in the worker processes, see init_worker)
+    :return: (block, distances), entries outside of block_mask are NaN
+    """
+    row_graphs, col_graphs, upper_triangle, node_cost, edge_cost = _worker_state
+    row_start, _, col_start, _ = block
+    mask = block_mask(block, upper_triangle)
+    distances = np.full(mask.shape, np.nan)
+    for i, j in zip(*np.nonzero(mask)):
+        distances[i, j] = prepared_distance(row_graphs[row_start + i], col_graphs[col_start + j],
+                                            node_cost=node_cost, edge_cost=edge_cost)
+    return block, distances
+
+
+def open_distance_file(outfile, meta):
+    """
+    Opens the .npy file of a distance matrix for resuming, or creates it filled with NaN (not computed yet). The
+    parameters are stored next to it in <outfile>.json.
+    :return: Memory-mapped matrix
+    """
+    meta_file = '{}.json'.format(outfile)
+    shape = (len(meta['rows']), len(meta['columns']))
+    if os.path.exists(outfile):
+        with open(meta_file) as f:
+            stored_meta = json.load(f)
+        if stored_meta != meta:
+            raise ValueError("outfile belongs to a distance matrix of other graphs or parameters [outfile={}]".format(
+                outfile))
+        return np.lib.format.open_memmap(outfile, mode='r+')
+
+    with open(meta_file, 'w') as f:
+        json.dump(meta, f)
+    matrix = np.lib.format.open_memmap(outfile, mode='w+', dtype=np.float64, shape=shape)
+    matrix[:] = np.nan
+    return matrix
+
+
+def mirror_upper_triangle(matrix, block_size):
+    """Copies the upper triangle into the lower one, block row by block row"""
+    for start in range(0, len(matrix), block_size):
+        end = min(start + block_size, len(matrix))
+        lower = np.arange(end)[np.newaxis, :] < np.arange(start, end)[:, np.newaxis]
+        rows = matrix[start:end, :end]
+        rows[lower] = np.asarray(matrix[:end, start:end]).T[lower]
+
+
+def distance_matrix(named_rows, named_columns=None, outfile=None, processes=1, block_size=64, upper_triangle=False,
+                    node_cost=1.0, edge_cost=1.0, normalize=True, progress=None):
+    """
+    Approximate graph edit distances between reference graphs (rows) and query graphs (columns), or between all
+    pairs of the reference graphs, computed in blocks by a pool of processes
+    :param named_rows: List of (name, graph), graphs see graph_arrays
+    :param named_columns: List of (name, graph), or None for all pairs of named_rows
+    :param outfile: .npy file the matrix is written to block by block; if it exists (with the same graphs and
+                    parameters, see <outfile>.json), only the missing blocks are computed
+    :param processes: Number of worker processes (1 = no pool, None = number of CPUs)
+    :param block_size: Edge length of the blocks
+    :param upper_triangle: For all pairs only: compute d(i, j) for i < j and use it for d(j, i) as well (halves the
+                           work; the bipartite approximation is not exactly symmetric), the diagonal is 0
+    :param progress: Function called with (number of finished blocks, number of blocks) after every block
+    :return: Distance matrix with shape (rows, columns) (memory-mapped if outfile is given)
+    """
+    if upper_triangle and named_columns is not None:
+        raise ValueError("upper_triangle needs all pairs of one graph list (named_columns=None)")
+    named_columns = named_rows if named_columns is None else named_columns
+
+    meta = {'rows': [name for name, _ in named_rows], 'columns': [name for name, _ in named_columns],
+            'upper_triangle': upper_triangle, 'node_cost': node_cost, 'edge_cost': edge_cost, 'normalize': normalize}
+    shape = (len(named_rows), len(named_columns))
+    matrix = open_distance_file(outfile, meta) if outfile else np.full(shape, np.nan)
+    if upper_triangle:
+        matrix[np.diag_indices(shape[0])] = 0.0
+
+    blocks = matrix_blocks(shape[0], shape[1], block_size, upper_triangle=upper_triangle)
+    pending = [block for block in blocks
+               if np.isnan(matrix[block[0]:block[1], block[2]:block[3]][block_mask(block, upper_triangle)]).any()]
+
+    row_graphs = [prepare_graph(graph, normalize=normalize) for _, graph in named_rows]
+    col_graphs = row_graphs if named_columns is named_rows else [prepare_graph(graph, normalize=normalize)
+                                                                 for _, graph in named_columns]
+    initargs = (row_graphs, col_graphs, upper_triangle, node_cost, edge_cost)
+
+    def store(results):
+        for finished, (block, distances) in enumerate(results, len(blocks) - len(pending) + 1):
+            target = matrix[block[0]:block[1], block[2]:block[3]]
+            computed = ~np.isnan(distances)
+            target[computed] = distances[computed]
+            if outfile:
+                matrix.flush()
+            if progress:
+                progress(finished, len(blocks))
+
+    processes = processes or multiprocessing.cpu_count()
+    if processes == 1 or len(pending) <= 1:
+        init_worker(*initargs)
+        store(compute_block(block) for block in pending)
+    else:
+        with multiprocessing.Pool(processes, initializer=init_worker, initargs=initargs) as pool:
+            store(pool.imap_unordered(compute_block, pending))
+
+    if upper_triangle:
+        mirror_upper_triangle(matrix, block_size)
+        if outfile:
+            matrix.flush()
+    return matrix
+
+
+def load_named_graphs(path, processes=1):
+    """
+    :param path: Directory with .gxl files or a binary dataset file (see graph_converter)
+    :return: List of (name, graph) with graphs as arrays (see graph_arrays)
+    """
+    if os.path.isdir(path):
+        return list(graph_converter.load_gxl_dataset(path, processes=processes, as_arrays=True).items())
+    dataset = graph_converter.open_dataset(path)
+    return [(name, (positions, edges)) for name, positions, edges in
+            (graph_converter.dataset_arrays(dataset, index) for index in range(len(dataset.names)))]
@@ -1,77 +1,130 @@
 #!/usr/bin/env python3
 
+import array
+import multiprocessing
 import os
-from collections import defaultdict
-import networkx as nx
+import shutil
+import tempfile
+from collections import OrderedDict, namedtuple
+import numpy as np
 import xml.etree.cElementTree as ElementTree
-import xml.dom.minidom
 
+from keypoint_graph import KeypointGraph
 
-def prettify(elem):
-    """Return a pretty-printed XML string for the Element.
-    """
-    rough_string = ElementTree.tostring(elem, 'utf-8')
-    reparsed = xml.dom.minidom.parseString(rough_string)
-    output = reparsed.toprettyxml(indent="\t", encoding="UTF-8")
-    return output.decode("utf-8")
-
+# networkx is imported in the functions that need it: it is slow to import and the GXL writer, the array loaders and
+# the binary dataset format work without it
 
-def save_graph_as_gxl(nxgraph, outfile, graphname=''):
-    if not graphname:
-        graphname = os.path.splitext(os.path.basename(outfile))[0]
 
-    root = ElementTree.Element("gxl")
-    graph = ElementTree.SubElement(root, "graph", edgeids="false", edgemode="undirected", id=graphname)
+GXL_DOCTYPE = '<!DOCTYPE gxl SYSTEM "http://www.gupro.de/GXL/gxl-1.0.dtd">'
 
-    for attr_name, attr_value in nxgraph.graph.items():
-        a = ElementTree.SubElement(graph, "attr", name=attr_name)
-        ElementTree.SubElement(a, type(attr_value).__name__).text = str(attr_value)
 
-    for node_name, node_attr in nxgraph.node.items():
-        node = ElementTree.SubElement(graph, "node", id='{}_{}'.format(graphname, node_name))
-        assert 'pos' in node_attr
-        x, y = node_attr['pos']
-        a = ElementTree.SubElement(node, "attr", name="x")
-        ElementTree.SubElement(a, "float").text = str(float(x))
-        a = ElementTree.SubElement(node, "attr", name="y")
-        ElementTree.SubElement(a, "float").text = str(float(y))
+def escape_xml(text):
+    """Escapes text and attribute values the same way xml.dom.minidom does
+    """
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
 
-        for attr_name, attr_value in node_attr.items():
-            # TODO: Rename 'pos' to x/y to be consistent
-            assert attr_name != 'x'
-            assert attr_name != 'y'
-            if attr_name == 'pos':
-                continue
 
-            a = ElementTree.SubElement(node, "attr", name=attr_name)
-            ElementTree.SubElement(a, "float").text = str(attr_value)
-            # ElementTree.SubElement(a, type(attr_value).__name__).text = str(attr_value)
+def unique_edges(nxgraph):
+    """Each undirected edge once, as (e1, e2) pairs grouped by e1
 
-    edges = defaultdict(list)
+    The order is the one of the former defaultdict(list) deduplication: nodes are grouped in the order they were
+    first seen (as a node or as a neighbor) and an edge belongs to the endpoint whose adjacency is visited first.
+    """
+    edges = dict()
+    seen = set()
     for e1 in nxgraph.edge:
         for e2 in nxgraph.edge[e1]:
-            if e1 not in edges[e2]:
-                if e2 not in edges[e1]:
-                    edges[e1].append(e2)
+            edges.setdefault(e2, [])
+            if (e2, e1) not in seen and (e1, e2) not in seen:
+                edges.setdefault(e1, []).append(e2)
+                seen.add((e1, e2))
+            else:
+                edges.setdefault(e1, [])
+    return [(e1, e2) for e1, neighbors in edges.items() for e2 in neighbors]
+
 
-    # edges = {e1: [e2 for e2 in nxgraph.edge[e1] if e1 <= e2] for e1 in nxgraph.edge}
-    # edges = {k: v for k, v in edges.items() if v}
-    for e1 in edges:
-        for e2 in edges[e1]:
-            ElementTree.SubElement(graph, "edge",
-                                   attrib={"from": '{}_{}'.format(graphname, e1),
-                                           "to": '{}_{}'.format(graphname, e2)})
+def gxl_attr(name, type_name, value, depth, indents, newline):
+    """One <attr> element with a typed value at the given depth
+    """
+    value = escape_xml(value)
+    if value:
+        typed = '<{type_name}>{value}</{type_name}>'.format(type_name=type_name, value=value)
+    else:
+        typed = '<{type_name}/>'.format(type_name=type_name)
+    return '{indent}<attr name="{name}">{nl}{inner_indent}{typed}{nl}{indent}</attr>{nl}'.format(
+        indent=indents[depth], name=escape_xml(name), nl=newline, inner_indent=indents[depth + 1], typed=typed)
+
+
+def write_gxl(f, nxgraph, graphname, compact=False):
+    """Streams a graph (networkx or KeypointGraph) as GXL to a text file handle
+
+    The default output is the pretty-printed layout (tab indentation, one element per line) of the former
+    ElementTree/minidom writer, byte for byte. compact=True writes the elements without indentation and newlines.
+    """
+    newline = '' if compact else '\n'
+    indents = [''] * 5 if compact else ['\t' * depth for depth in range(5)]
+    node_prefix = escape_xml('{}_'.format(graphname))
+
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write('{}\n'.format(GXL_DOCTYPE))
+    f.write('<gxl>{}'.format(newline))
+
+    graph_tag = '{}<graph edgeids="false" edgemode="undirected" id="{}"'.format(indents[1], escape_xml(graphname))
+    if isinstance(nxgraph, KeypointGraph):
+        nodes = ((node_name, {'pos': pos}) for node_name, pos in enumerate(nxgraph.positions.tolist()))
+        edges = nxgraph.gxl_edges().tolist()
+    else:
+        nodes = nxgraph.node.items()
+        edges = unique_edges(nxgraph)
 
-    pretty = prettify(root)
-    lines = pretty.split('\n')
-    lines.insert(1, '<!DOCTYPE gxl SYSTEM "http://www.gupro.de/GXL/gxl-1.0.dtd">')
+    if nxgraph.graph or nxgraph.number_of_nodes() or edges:
+        f.write('{}>{}'.format(graph_tag, newline))
+
+        for attr_name, attr_value in nxgraph.graph.items():
+            f.write(gxl_attr(attr_name, type(attr_value).__name__, str(attr_value), 2, indents, newline))
+
+        for node_name, node_attr in nodes:
+            assert 'pos' in node_attr
+            x, y = node_attr['pos']
+            node = ['{}<node id="{}{}">{}'.format(indents[2], node_prefix, escape_xml(str(node_name)), newline),
+                    gxl_attr('x', 'float', str(float(x)), 3, indents, newline),
+                    gxl_attr('y', 'float', str(float(y)), 3, indents, newline)]
+
+            for attr_name, attr_value in node_attr.items():
+                # TODO: Rename 'pos' to x/y to be consistent
+                assert attr_name != 'x'
+                assert attr_name != 'y'
+                if attr_name == 'pos':
+                    continue
+
+                node.append(gxl_attr(attr_name, 'float', str(attr_value), 3, indents, newline))
+
+            node.append('{}</node>{}'.format(indents[2], newline))
+            f.write(''.join(node))
+
+        for e1, e2 in edges:
+            f.write('{indent}<edge from="{prefix}{e1}" to="{prefix}{e2}"/>{nl}'.format(
+                indent=indents[2], prefix=node_prefix, e1=escape_xml(str(e1)), e2=escape_xml(str(e2)), nl=newline))
+
+        f.write('{}</graph>{}'.format(indents[1], newline))
+    else:
+        f.write('{}/>{}'.format(graph_tag, newline))
+
+    # The pretty-printed layout always ended with an empty line
+    f.write('</gxl>\n' if compact else '</gxl>\n\n')
+
+
+def save_graph_as_gxl(nxgraph, outfile, graphname='', compact=False):
+    if not graphname:
+        graphname = os.path.splitext(os.path.basename(outfile))[0]
 
-    with open(outfile, "w") as f:
-        for line in lines:
-            f.write('{}\n'.format(line))
+    with open(outfile, "w", encoding="utf-8") as f:
+        write_gxl(f, nxgraph, graphname, compact=compact)
 
 
 def convert_yaml_to_gxl(infile, outfile, graphname=''):
+    import networkx as nx
+
     nxgraph = nx.read_yaml(infile)
     if not graphname:
         graphname = os.path.splitext(os.path.basename(infile))[0]
@@ -86,69 +139,355 @@ def remove_prefix(text, prefix):
         return text
 
 
-def load_gxl_to_graph(infile):
-    nxgraph = nx.Graph()
+GxlArrays = namedtuple('GxlArrays', ['graphname', 'node_names', 'positions', 'edges'])
 
-    tree = ElementTree.parse(infile)
-    root = tree.getroot()
-    assert root.tag == 'gxl'
-    assert len(root) == 1
 
-    graph = root[0]
-    assert graph.tag == 'graph'
+def parse_gxl(infile):
+    """Parses a GXL file incrementally (iterparse), clearing every node and edge element once it is read
+
+    :return: (graphname, graph attributes, list of (node name, node attributes), list of (from, to) edges)
+    """
+    node_ids = list()
+    node_attrs = list()
+    edge_ids = list()
+    graph = None
+
+    for _, elem in ElementTree.iterparse(infile, events=('end',)):
+        tag = elem.tag
+        if tag == "node":
+            assert len(elem.attrib) == 1
+            node_attr = dict()
+            for attr in elem:
+                assert attr.tag == 'attr'
+                for attr_value in attr:
+                    assert attr_value.tag == 'float'
+                    node_attr[attr.attrib['name']] = float(attr_value.text)
+            assert 'x' in node_attr and 'y' in node_attr
+            # TODO: Rename 'pos' to x/y to be consistent
+            assert 'pos' not in node_attr
+            node_ids.append(elem.attrib['id'])
+            node_attrs.append(node_attr)
+            elem.clear()
+
+        elif tag == "edge":
+            assert len(elem.attrib) == 2
+            edge_ids.append((elem.attrib['from'], elem.attrib['to']))
+            elem.clear()
+
+        elif tag == "graph":
+            assert graph is None
+            graph = elem
 
+        elif tag == "gxl":
+            assert len(elem) == 1
+
+    assert graph is not None
     assert all(key in graph.attrib for key in ("edgeids", "edgemode", "id"))
     assert graph.attrib['edgeids'] == "false"
     assert graph.attrib['edgemode'] == "undirected"
     graphname = graph.attrib['id']
     nodeprefix = '{}_'.format(graphname)
 
+    graph_attr = dict()
     for elem in graph:
         if elem.tag == "attr":
             assert 'name' in elem.attrib
-            attr_name = elem.attrib['name']
             assert len(elem) == 1
-            attr_value = list(elem[0].itertext())[0]
-            nxgraph.graph[attr_name] = attr_value
+            graph_attr[elem.attrib['name']] = elem[0].text or ''
 
-        elif elem.tag == "node":
-            assert len(elem.attrib) == 1
-            assert 'id' in elem.attrib
-            node_name = int(remove_prefix(text=elem.attrib['id'], prefix=nodeprefix))
-            # assert len(elem) == 2
-            pos_dict = dict()
-            for attr in elem:
-                assert attr.tag == 'attr'
-                assert 'name' in attr.attrib
-                for attr_value in attr:
-                    assert attr_value.tag == 'float'
-                    value = float(list(attr_value.itertext())[0])
-                    name = attr.attrib['name']
-                    pos_dict[name] = value
-            assert all(key in pos_dict for key in ('x', 'y'))
-            pos = (pos_dict['x'], pos_dict['y'])
-            nxgraph.add_node(node_name, pos=pos)
-
-            for attr_name, attr_value in pos_dict.items():
-                # TODO: Rename 'pos' to x/y to be consistent
-                assert attr_name != 'pos'
-                if attr_name in ('x', 'y'):
-                    continue
-                nxgraph.node[node_name][attr_name] = attr_value
+    nodes = [(int(remove_prefix(text=node_id, prefix=nodeprefix)), node_attr)
+             for node_id, node_attr in zip(node_ids, node_attrs)]
+    edges = [(int(remove_prefix(text=e1, prefix=nodeprefix)), int(remove_prefix(text=e2, prefix=nodeprefix)))
+             for e1, e2 in edge_ids]
+
+    return graphname, graph_attr, nodes, edges
 
-        elif elem.tag == "edge":
-            assert len(elem.attrib) == 2
-            assert all(key in elem.attrib for key in ('to', 'from'))
-            e1 = int(remove_prefix(text=elem.attrib['from'], prefix=nodeprefix))
-            e2 = int(remove_prefix(text=elem.attrib['to'], prefix=nodeprefix))
-            nxgraph.add_edge(e1, e2)
 
-    nxgraph = nxgraph.to_undirected()
+def node_data(node_attr):
+    data = {'pos': (node_attr['x'], node_attr['y'])}
+    data.update((attr_name, attr_value) for attr_name, attr_value in node_attr.items() if attr_name not in ('x', 'y'))
+    return data
+
+
+def load_gxl_to_graph(infile):
+    import networkx as nx
+
+    graphname, graph_attr, nodes, edges = parse_gxl(infile)
+
+    nxgraph = nx.Graph()
+    nxgraph.graph.update(graph_attr)
+    nxgraph.add_nodes_from((node_name, node_data(node_attr)) for node_name, node_attr in nodes)
+    nxgraph.add_edges_from(edges)
     nxgraph.graph['sourceGXL'] = os.path.abspath(infile)
 
     return nxgraph
 
 
+def load_gxl_to_arrays(infile):
+    """Loads a GXL file without networkx
+
+    :return: GxlArrays with the node names, the float (x, y) node positions with shape (n, 2) and the edges as
+             int index pairs into the node arrays with shape (m, 2)
+    """
+    graphname, _, nodes, edges = parse_gxl(infile)
+
+    node_names = np.array([node_name for node_name, _ in nodes], dtype=np.int64)
+    positions = np.array([(node_attr['x'], node_attr['y']) for _, node_attr in nodes], dtype=np.float64).reshape(-1, 2)
+    index_of_node = {node_name: index for index, node_name in enumerate(node_names.tolist())}
+    edges = np.array([(index_of_node[e1], index_of_node[e2]) for e1, e2 in edges], dtype=np.int64).reshape(-1, 2)
+
+    return GxlArrays(graphname=graphname, node_names=node_names, positions=positions, edges=edges)
+
+
+def load_gxl_dataset(indir, processes=1, as_arrays=False):
+    """Loads all GXL files of a directory
+
+    :param indir: Directory with .gxl files
+    :param processes: Number of worker processes (1 = load in this process, None = number of CPUs)
+    :param as_arrays: Load GxlArrays (see load_gxl_to_arrays) instead of networkx graphs
+    :return: OrderedDict file name -> graph, sorted by file name
+    """
+    filenames = sorted(name for name in os.listdir(indir) if name.endswith('.gxl'))
+    infiles = [os.path.join(indir, name) for name in filenames]
+    loader = load_gxl_to_arrays if as_arrays else load_gxl_to_graph
+
+    if processes == 1:
+        graphs = [loader(infile) for infile in infiles]
+    else:
+        processes = processes or multiprocessing.cpu_count()
+        with multiprocessing.Pool(processes) as pool:
+            graphs = pool.map(loader, infiles, chunksize=max(1, len(infiles) // (processes * 4)))
+
+    return OrderedDict(zip(filenames, graphs))
+
+
 def convert_gxl_to_yaml(infile, outfile):
+    import networkx as nx
+
     nxgraph = load_gxl_to_graph(infile)
     nx.write_yaml(nxgraph, outfile)
+
+
+# Binary dataset format for keypoint graphs. All numbers are little endian:
+#   header          magic (8 bytes), number of graphs, total nodes, total edges, length of the names block (int64 each)
+#   node_offsets    int64[num_graphs + 1], nodes of graph i are positions[node_offsets[i]:node_offsets[i + 1]]
+#   edge_offsets    int64[num_graphs + 1], edges of graph i are edges[edge_offsets[i]:edge_offsets[i + 1]]
+#   positions       float32[num_nodes, 2], (x, y) of every node
+#   edges           int32[num_edges, 2], node indices relative to the first node of the graph
+#   names           utf-8 graph names, separated by newlines
+DATASET_MAGIC = b'SKGRAPH1'
+DATASET_HEADER = np.dtype([('magic', 'S8'), ('num_graphs', '<i8'), ('num_nodes', '<i8'), ('num_edges', '<i8'),
+                           ('names_length', '<i8')])
+
+GraphDataset = namedtuple('GraphDataset', ['names', 'node_offsets', 'edge_offsets', 'positions', 'edges'])
+
+
+def graph_to_arrays(nxgraph):
+    """Node positions and edges of a keypoint graph (networkx or KeypointGraph) as arrays, nodes are numbered in node
+    order
+
+    :return: (positions, edges): float32 (x, y) positions with shape (n, 2), int32 node index pairs with shape (m, 2)
+    """
+    if isinstance(nxgraph, KeypointGraph):
+        return nxgraph.positions.astype(np.float32), nxgraph.gxl_edges().astype(np.int32)
+
+    index_of_node = {node_name: index for index, node_name in enumerate(nxgraph.node)}
+    positions = np.array([node_attr['pos'] for node_attr in nxgraph.node.values()], dtype=np.float32).reshape(-1, 2)
+    edges = np.array([(index_of_node[e1], index_of_node[e2]) for e1, e2 in unique_edges(nxgraph)],
+                     dtype=np.int32).reshape(-1, 2)
+    return positions, edges
+
+
+def arrays_to_graph(positions, edges, **kwargs):
+    import networkx as nx
+
+    nxgraph = nx.Graph(**kwargs)
+    nxgraph.add_nodes_from((index, {'pos': (float(x), float(y))}) for index, (x, y) in enumerate(positions.tolist()))
+    nxgraph.add_edges_from(edges.tolist())
+    return nxgraph
+
+
+def write_array_dataset(outfile, named_arrays):
+    """Writes keypoint graphs to a binary dataset file
+
+    :param outfile: Path to the dataset file
+    :param named_arrays: Iterable of (name, positions, edges), see graph_to_arrays
+    """
+    writer = DatasetFileWriter(outfile)
+    for name, positions, edges in named_arrays:
+        writer.add(name, positions, edges)
+    writer.close()
+
+
+def dataset_header(num_graphs, num_nodes, num_edges, names_length):
+    header = np.zeros(1, dtype=DATASET_HEADER)
+    header['magic'] = DATASET_MAGIC
+    header['num_graphs'] = num_graphs
+    header['num_nodes'] = num_nodes
+    header['num_edges'] = num_edges
+    header['names_length'] = names_length
+    return header.tobytes()
+
+
+def dump_array_dataset(f, named_arrays):
+    """Writes keypoint graphs in the binary dataset format to a binary file handle, see write_array_dataset"""
+    names = list()
+    positions = list()
+    edges = list()
+    for name, graph_positions, graph_edges in named_arrays:
+        assert '\n' not in name
+        names.append(name)
+        positions.append(np.asarray(graph_positions, dtype='<f4').reshape(-1, 2))
+        edges.append(np.asarray(graph_edges, dtype='<i4').reshape(-1, 2))
+
+    node_offsets = np.concatenate(([0], np.cumsum([len(p) for p in positions]))).astype('<i8')
+    edge_offsets = np.concatenate(([0], np.cumsum([len(e) for e in edges]))).astype('<i8')
+    names_block = '\n'.join(names).encode('utf-8')
+
+    f.write(dataset_header(len(names), node_offsets[-1], edge_offsets[-1], len(names_block)))
+    f.write(node_offsets.tobytes())
+    f.write(edge_offsets.tobytes())
+    for graph_positions in positions:
+        f.write(graph_positions.tobytes())
+    for graph_edges in edges:
+        f.write(graph_edges.tobytes())
+    f.write(names_block)
+
+
+class DatasetFileWriter(object):
+    """
+    Writes keypoint graphs one by one to a binary dataset file. The positions, edges and names are spooled to
+    temporary files next to outfile and copied behind the header on close, so only the node and edge counts
+    (16 bytes per graph) are kept in memory. Gives the same file as write_array_dataset.
+    """
+
+    def __init__(self, outfile):
+        self.outfile = outfile
+        spool_dir = os.path.dirname(os.path.abspath(outfile))
+        self.positions_file = tempfile.TemporaryFile(dir=spool_dir)
+        self.edges_file = tempfile.TemporaryFile(dir=spool_dir)
+        self.names_file = tempfile.TemporaryFile(dir=spool_dir)
+        self.node_counts = array.array('q')
+        self.edge_counts = array.array('q')
+
+    def add(self, name, positions, edges):
+        """
+        :param name: Graph name (without newlines)
+        :param positions: Node positions, see graph_to_arrays
+        :param edges: Node index pairs, see graph_to_arrays
+        """
+        assert '\n' not in name
+        positions = np.asarray(positions, dtype='<f4').reshape(-1, 2)
+        edges = np.asarray(edges, dtype='<i4').reshape(-1, 2)
+        if self.node_counts:
+            self.names_file.write(b'\n')
+        self.names_file.write(name.encode('utf-8'))
+        self.positions_file.write(positions.tobytes())
+        self.edges_file.write(edges.tobytes())
+        self.node_counts.append(len(positions))
+        self.edge_counts.append(len(edges))
+
+    def close(self):
+        try:
+            node_offsets = np.concatenate(([0], np.cumsum(self.node_counts, dtype=np.int64))).astype('<i8')
+            edge_offsets = np.concatenate(([0], np.cumsum(self.edge_counts, dtype=np.int64))).astype('<i8')
+            with open(self.outfile, 'wb') as f:
+                f.write(dataset_header(len(self.node_counts), node_offsets[-1], edge_offsets[-1],
+                                       self.names_file.tell()))
+                f.write(node_offsets.tobytes())
+                f.write(edge_offsets.tobytes())
+                for spool in (self.positions_file, self.edges_file, self.names_file):
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, f)
+        finally:
+            for spool in (self.positions_file, self.edges_file, self.names_file):
+                spool.close()
+
+
+def write_graph_dataset(outfile, named_graphs):
+    """Writes networkx keypoint graphs to a binary dataset file (only node positions and edges are stored)
+
+    :param outfile: Path to the dataset file
+    :param named_graphs: Iterable of (name, nxgraph)
+    """
+    write_array_dataset(outfile, ((name,) + graph_to_arrays(nxgraph) for name, nxgraph in named_graphs))
+
+
+def memmap_array(infile, dtype, offset, shape):
+    if not np.prod(shape):
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(infile, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+def open_dataset(infile):
+    """Opens a binary dataset file with np.memmap, graphs are only read when they are sliced out
+
+    :return: GraphDataset
+    """
+    header = np.fromfile(infile, dtype=DATASET_HEADER, count=1)
+    assert len(header) == 1 and header['magic'][0] == DATASET_MAGIC, 'Not a graph dataset: {}'.format(infile)
+    num_graphs, num_nodes, num_edges, names_length = (int(header[key][0]) for key in
+                                                      ('num_graphs', 'num_nodes', 'num_edges', 'names_length'))
+
+    offset = DATASET_HEADER.itemsize
+    node_offsets = memmap_array(infile, '<i8', offset, (num_graphs + 1,))
+    offset += node_offsets.nbytes
+    edge_offsets = memmap_array(infile, '<i8', offset, (num_graphs + 1,))
+    offset += edge_offsets.nbytes
+    positions = memmap_array(infile, '<f4', offset, (num_nodes, 2))
+    offset += positions.nbytes
+    edges = memmap_array(infile, '<i4', offset, (num_edges, 2))
+    offset += edges.nbytes
+
+    with open(infile, 'rb') as f:
+        f.seek(offset)
+        names_block = f.read(names_length).decode('utf-8')
+    names = names_block.split('\n') if num_graphs else list()
+
+    return GraphDataset(names=names, node_offsets=node_offsets, edge_offsets=edge_offsets,
+                        positions=positions, edges=edges)
+
+
+def dataset_arrays(dataset, index):
+    """(name, positions, edges) of one graph of a GraphDataset, the arrays are views into the memory map
+    """
+    node_start, node_end = dataset.node_offsets[index:index + 2]
+    edge_start, edge_end = dataset.edge_offsets[index:index + 2]
+    return dataset.names[index], dataset.positions[node_start:node_end], dataset.edges[edge_start:edge_end]
+
+
+def dataset_graph(dataset, index):
+    _, positions, edges = dataset_arrays(dataset, index)
+    return arrays_to_graph(positions, edges)
+
+
+def convert_gxl_to_dataset(infiles, outfile):
+    def named_arrays():
+        for infile in infiles:
+            gxl_arrays = load_gxl_to_arrays(infile)
+            yield gxl_arrays.graphname, gxl_arrays.positions, gxl_arrays.edges
+
+    write_array_dataset(outfile, named_arrays())
+
+
+def convert_dataset_to_gxl(infile, outdir):
+    dataset = open_dataset(infile)
+    os.makedirs(outdir, exist_ok=True)
+    for index, name in enumerate(dataset.names):
+        save_graph_as_gxl(dataset_graph(dataset, index), os.path.join(outdir, '{}.gxl'.format(name)), graphname=name)
+
+
+def convert_yaml_to_dataset(infiles, outfile):
+    import networkx as nx
+
+    write_graph_dataset(outfile, ((os.path.splitext(os.path.basename(infile))[0], nx.read_yaml(infile))
+                                  for infile in infiles))
+
+
+def convert_dataset_to_yaml(infile, outdir):
+    import networkx as nx
+
+    dataset = open_dataset(infile)
+    os.makedirs(outdir, exist_ok=True)
+    for index, name in enumerate(dataset.names):
+        nx.write_yaml(dataset_graph(dataset, index), os.path.join(outdir, '{}.yaml'.format(name)))
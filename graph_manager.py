@@ -1,17 +1,15 @@
 #!/usr/bin/env python3
 
 import itertools
-import operator
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 
-import networkx as nx
 import numpy as np
-import scipy
-import scipy.signal
 from scipy.ndimage import measurements
 
 import graph_converter
+import neighbor_manager
 from binarize_manager import invert_image
+from keypoint_graph import KeypointGraph
 
 
 def pairwise(iterable):
@@ -21,32 +19,33 @@ def pairwise(iterable):
     return zip(a, b)
 
 
+def find_points(mask, lut):
+    ys, xs = neighbor_manager.find_pixels(mask, lut)
+    return list(zip(ys.tolist(), xs.tolist()))
+
+
 def get_endpoints_and_junctions(skeleton):
-    a = invert_image(skeleton)
-    b = np.matrix([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
-    c = scipy.signal.convolve2d(a, b, 'same')
-    d = np.multiply(a, c)
-
-    endpoints = []
-    possible_junctions = []
-    for index, value in np.ndenumerate(d):
-        if value > 2:
-            possible_junctions.append(index)
-        elif value == 1:
-            endpoints.append(index)
-
-    # clean junction points
-    junctions = []
+    a = np.logical_not(skeleton)
+    d = neighbor_manager.count_neighbors(a) * a
+
+    endpoints = find_points(a, neighbor_manager.ENDPOINT_LUT)
+    possible_junctions = find_points(a, neighbor_manager.JUNCTION_LUT)
+
+    # clean junction points (a point is added at most once, so removed points are only dropped from the set)
+    junction_candidates = []
+    junction_set = set()
     for point in possible_junctions:
         found_better = False
         for neighbor in get_neighbor_points(point[0], point[1]):
-            if neighbor in junctions:
+            if neighbor in junction_set:
                 if d[neighbor] <= d[point]:
-                    junctions.remove(neighbor)
+                    junction_set.remove(neighbor)
                 else:
                     found_better = True
         if not found_better:
-            junctions.append(point)
+            junction_candidates.append(point)
+            junction_set.add(point)
+    junctions = [point for point in junction_candidates if point in junction_set]
 
     return endpoints, junctions, possible_junctions
 
@@ -84,200 +83,506 @@ def get_following_points(y, x):
     return result
 
 
-def find_next_point(img, point):
+def pad_skeleton(skeleton):
+    """
+    Flattens a skeleton image for tracing
+    :param skeleton: Skeleton image (0 = black/skeleton, 1 = white)
+    :return: (ink, width): bytearray with 1 for black pixels and a one pixel white border, width of a padded row
+    """
     _BLACK = 0
-    _WHITE = 1
 
-    # TODO: Write your own iterator
-    neighbor_and_distance = [(tuple(map(operator.add, point, (-1, -1))), 1.41),
-                             (tuple(map(operator.add, point, (-1, 0))), 1.0),
-                             (tuple(map(operator.add, point, (-1, 1))), 1.41),
-                             (tuple(map(operator.add, point, (0, 1))), 1.0),
-                             (tuple(map(operator.add, point, (1, 1))), 1.41),
-                             (tuple(map(operator.add, point, (1, 0))), 1.0),
-                             (tuple(map(operator.add, point, (1, -1))), 1.41),
-                             (tuple(map(operator.add, point, (0, -1))), 1.0)]
-
-    for neighbor, distance in neighbor_and_distance:
-        try:
-            if img[neighbor] == _BLACK:
-                return neighbor, distance
-        except IndexError:
-            pass
-    else:
-        return point, 0
+    height, width = skeleton.shape
+    ink = bytearray((height + 2) * (width + 2))
+    # Written straight into the bytearray, without an intermediate padded image
+    np.equal(skeleton, _BLACK, out=ink_image(ink, width + 2))
+    return ink, width + 2
 
 
-def find_path(img, start_point, step_length):
-    _BLACK = 0
-    _WHITE = 1
+def ink_image(ink, width):
+    """Writable view of the (unpadded) black pixels remaining in a padded skeleton"""
+    return np.frombuffer(ink, dtype=np.uint8).reshape(-1, width)[1:-1, 1:-1]
 
-    list_points = [start_point]
-    cur_delta = 0.0
 
-    cur_point = start_point
-    img[cur_point] = _WHITE
+def trace_chain(ink, width, start_point):
+    """
+    Follows the skeleton from start_point and removes the visited pixels from ink
+    :param ink: Padded skeleton (see pad_skeleton), modified in place
+    :param width: Width of a padded row
+    :param start_point: (y, x) start point
+    :return: Array of shape (n, 2) with the (y, x) pixel chain, starting with start_point
+    """
+    # Same neighbor order as before (clockwise from top-left), as linear offsets into the padded image
+    offsets = [dy * width + dx for dy, dx in neighbor_manager.NEIGHBOR_OFFSETS]
 
+    cur = (start_point[0] + 1) * width + start_point[1] + 1
+    ink[cur] = 0
+    chain = [cur]
     while True:
-        next_point, distance = find_next_point(img, cur_point)
-        if not distance:
+        for offset in offsets:
+            if ink[cur + offset]:
+                cur += offset
+                ink[cur] = 0
+                chain.append(cur)
+                break
+        else:
             break
 
-        cur_delta += distance
-        img[next_point] = _WHITE
-        cur_point = next_point
-        if cur_delta >= step_length:
-            list_points.append(cur_point)
-            cur_delta = 0.0
+    chain = np.array(chain, dtype=np.intp)
+    return np.stack([chain // width - 1, chain % width - 1], axis=1)
 
-    if cur_point not in list_points:
-        list_points.append(cur_point)
 
-    return list_points, img
+def sample_chain(chain, step_length):
+    """
+    Samples a pixel chain at step_length along its arc length
+    :param chain: Array of shape (n, 2) with the (y, x) pixel chain
+    :param step_length: Arc length between two sampled points (straight steps count 1.0, diagonal steps 1.41)
+    :return: Array of shape (m, 2) with the sampled points, always including the first and the last point
+    """
+    # Arc length in hundredths, so that the accumulated steps are exact integers
+    diagonal = np.all(chain[1:] != chain[:-1], axis=1)
+    arc = np.concatenate(([0], np.cumsum(np.where(diagonal, 141, 100))))
+    threshold = step_length * 100
 
+    indices = [0]
+    while True:
+        last = indices[-1]
+        nxt = last + 1 + np.searchsorted(arc[last + 1:], arc[last] + threshold)
+        if nxt >= len(arc):
+            break
+        indices.append(nxt)
+    if indices[-1] != len(chain) - 1:
+        indices.append(len(chain) - 1)
 
-def count_neighbor_values(img, point, count_zero=False):
-    neighbors = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)]
-    result_dict = defaultdict(int)
-    for neighbor in neighbors:
-        value = img[tuple(map(operator.add, point, neighbor))]
-        if value or count_zero:
-            result_dict[value] += 1
-    return result_dict
+    return chain[indices]
 
 
-def list_neighbor_values(img, point, count_zero=False):
-    neighbors = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1)]
-    result_list = list()
-    for neighbor in neighbors:
-        try:
-            value = img[tuple(map(operator.add, point, neighbor))]
-        except IndexError:
-            pass
-        else:
-            if value or count_zero:
-                result_list.append(value)
-    return result_list
+def chain_to_points(chain):
+    return [tuple(point) for point in chain.tolist()]
 
 
-def skeleton_to_paths(skeleton, step_length):
-    _BLACK = 0
+def find_path(img, start_point, step_length):
     _WHITE = 1
 
-    endpoints, junctions, possible_junctions = get_endpoints_and_junctions(skeleton)
+    ink, width = pad_skeleton(img)
+    chain = trace_chain(ink, width, start_point)
+    img[chain[:, 0], chain[:, 1]] = _WHITE
 
-    # Remove junction points from image
-    img_no_junctions = np.copy(skeleton)
-    for junction in possible_junctions:
-        img_no_junctions[junction] = _WHITE
+    return chain_to_points(sample_chain(chain, step_length)), img
 
-    # Junction image
-    junction_image = np.ones_like(skeleton)
-    for junction in possible_junctions:
-        junction_image[junction] = _BLACK
 
-    img_junction_labels, num = measurements.label(invert_image(junction_image), structure=np.ones((3, 3)))
+def count_neighbor_values(img, point, count_zero=False):
+    result_dict = defaultdict(int)
+    for value in list_neighbor_values(img, point, count_zero=count_zero):
+        result_dict[value] += 1
+    return result_dict
+
+
+def list_neighbor_values(img, point, count_zero=False):
+    return list_neighbor_values_of_points(img, [point], count_zero=count_zero)[0]
+
+
+def list_neighbor_values_of_points(img, points, count_zero=False):
+    """Neighbor values (clockwise from top-left, inside the image only) for many points at once"""
+    values, inside = neighbor_manager.neighbor_values(img, points)
+    if not count_zero:
+        inside &= values != 0
+    return [row_values[row_inside].tolist() for row_values, row_inside in zip(values, inside)]
+
+
+def label_centroids(labels, num, ys, xs):
+    """
+    Rounded centroid of every label
+    :param labels: Label (1..num) of every labeled pixel
+    :param num: Number of labels
+    :param ys: y coordinates of the labeled pixels
+    :param xs: x coordinates of the labeled pixels
+    :return: List of (y, x) centroids, one per label
+    """
+    counts = np.bincount(labels, minlength=num + 1)[1:]
+    mean_ys = np.bincount(labels, weights=ys, minlength=num + 1)[1:] / counts
+    mean_xs = np.bincount(labels, weights=xs, minlength=num + 1)[1:] / counts
+    # np.round rounds half to even, like the built-in round
+    return list(zip(np.round(mean_ys).astype(int).tolist(), np.round(mean_xs).astype(int).tolist()))
+
+
+def label_start_points(labels, num, ys, xs):
+    """
+    Left-most (and of those the top-most) pixel of every label
+    :param labels: Label (1..num) of every labeled pixel
+    :param num: Number of labels
+    :param ys: y coordinates of the labeled pixels
+    :param xs: x coordinates of the labeled pixels
+    :return: List of (y, x) start points, one per label
+    """
+    order = np.lexsort((ys, xs, labels))
+    first = order[np.searchsorted(labels[order], np.arange(1, num + 1))]
+    return list(zip(ys[first].tolist(), xs[first].tolist()))
+
+
+# Traced skeleton: paths is a list of (pixel chain, junction point before the chain or None, junction point after the
+# chain or None), junction_paths are the direct connections between two junctions, circles the pixel chains of closed
+# loops and ep_next_to_junction the chain ends next to a junction, which are replaced by the junction point.
+# junction_path_keys and circle_keys are the endpoint a junction path was found at and the first pixel (row-major) of
+# every circle, they give the order of junction_paths and circles (see merge_chains).
+SkeletonChains = namedtuple('SkeletonChains', ['paths', 'junction_paths', 'circles', 'ep_next_to_junction',
+                                               'junction_path_keys', 'circle_keys'])
+
+
+def skeleton_to_chains(skeleton):
+    """
+    Traces the full pixel chains of a skeleton, independent of the step length
+    :param skeleton: Skeleton image (0 = black/skeleton, 1 = white)
+    :return: SkeletonChains, see chains_to_paths
+    """
+    endpoints, junctions, possible_junctions = get_endpoints_and_junctions(skeleton)
+
+    junction_ys, junction_xs = np.array(possible_junctions, dtype=np.intp).reshape(-1, 2).T
+
+    # Remove junction points from the padded ink image (1 = black) used for the tracing: its unpadded view
+    # remaining_ink takes the place of a copy of the skeleton without junctions
+    ink, width = pad_skeleton(skeleton)
+    remaining_ink = ink_image(ink, width)
+    remaining_ink[junction_ys, junction_xs] = 0
 
-    junction_groups = [[] for x in range(num)]
-    for index, value in np.ndenumerate(img_junction_labels):
-        if value:
-            junction_groups[value - 1].append(index)
+    # Junction image (True = junction point)
+    junction_mask = np.zeros(skeleton.shape, dtype=bool)
+    junction_mask[junction_ys, junction_xs] = True
+    img_junction_labels, num = measurements.label(junction_mask, structure=np.ones((3, 3)))
+    del junction_mask
 
-    junction_points = [tuple([int(round(sum(y) / float(len(y)), 0)) for y in zip(*x)]) for x in junction_groups]
+    junction_points = label_centroids(img_junction_labels[junction_ys, junction_xs], num, junction_ys, junction_xs)
 
-    endpoints_temp, _, _ = get_endpoints_and_junctions(img_no_junctions)
+    # The ink image only holds 0 and 1, so it can be viewed as the boolean mask of the black pixels
+    endpoints_temp = find_points(remaining_ink.view(np.bool_), neighbor_manager.ENDPOINT_LUT)
 
     neighbor_junction = dict()
-    ignore_endpoints = list()
+    ignore_endpoints = set()
     junction_paths = list()
+    junction_path_keys = list()
     ep_other = list()
-    for point in endpoints_temp:
-        neighbor_values = list_neighbor_values(img_junction_labels, point, count_zero=False)
+    for point, neighbor_values in zip(endpoints_temp,
+                                      list_neighbor_values_of_points(img_junction_labels, endpoints_temp)):
         if len(neighbor_values) == 1:
             neighbor_junction[point] = junction_points[neighbor_values[0] - 1]
         elif len(neighbor_values) == 2:
-            ignore_endpoints.append(point)
+            ignore_endpoints.add(point)
             junction_paths.append([junction_points[neighbor_values[0] - 1], junction_points[neighbor_values[1] - 1]])
+            junction_path_keys.append(point)
         else:
             ep_other.append(point)  # no junction nearby
 
     ep_next_to_junction = sorted(list(neighbor_junction.keys()), key=lambda element: (element[1], element[0]))
     ep_other = sorted(ep_other, key=lambda element: (element[1], element[0]))
 
-    temp_img = np.copy(img_no_junctions)
-    list_of_paths = list()
+    chains = list()
     for ep in itertools.chain(ep_next_to_junction, ep_other):
         if ep not in ignore_endpoints:
-            path, temp_img = find_path(img=temp_img, start_point=ep, step_length=step_length)
-            if path[0] in neighbor_junction:
-                path.insert(0, neighbor_junction[path[0]])
-            if path[-1] in neighbor_junction:
-                path.append(neighbor_junction[path[-1]])
-            list_of_paths.append(path)
+            chain = trace_chain(ink, width, ep)
+            chains.append((chain, neighbor_junction.get(ep), neighbor_junction.get(tuple(chain[-1].tolist()))))
         else:
-            temp_img[ep] = _WHITE
-
-    list_of_paths.extend(junction_paths)
-
-    # Find missing areas aka circles
-    circles, num = measurements.label(invert_image(temp_img), structure=np.ones((3, 3)))
-
-    if not num:
-        circle_start_points = list()
-    else:
-        circle_start_points = [None for x in range(num)]
-        for index, value in np.ndenumerate(circles):
-            if value:
-                cur_point = circle_start_points[value - 1]
-                if cur_point:
-                    if cur_point[1] > index[1]:
-                        circle_start_points[value - 1] = index
-                    if cur_point[1] == index[1]:
-                        if cur_point[0] > index[0]:
-                            circle_start_points[value - 1] = index
-                else:
-                    circle_start_points[value - 1] = index
+            remaining_ink[ep] = 0
+
+    # Find missing areas aka circles, labeled into the buffer of the junction labels (no longer needed)
+    circles = img_junction_labels
+    num = measurements.label(remaining_ink, structure=np.ones((3, 3)), output=circles)
+
+    circle_ys, circle_xs = np.nonzero(circles)
+    circle_start_points = label_start_points(circles[circle_ys, circle_xs], num, circle_ys, circle_xs)
+
+    circle_chains = [trace_chain(ink, width, cs) for cs in circle_start_points]
+
+    # Labels are numbered in row-major order of their first pixel
+    circle_values = circles[circle_ys, circle_xs]
+    _, first_pixels = np.unique(circle_values, return_index=True)
+    circle_keys = list(zip(circle_ys[first_pixels].tolist(), circle_xs[first_pixels].tolist()))
+
+    return SkeletonChains(paths=chains, junction_paths=junction_paths, circles=circle_chains,
+                          ep_next_to_junction=set(ep_next_to_junction),
+                          junction_path_keys=junction_path_keys, circle_keys=circle_keys)
+
+
+def translate_chains(chains, dy, dx):
+    """
+    Moves traced chains, e.g. from the coordinates of an image crop to the coordinates of the full image
+    :param chains: SkeletonChains
+    :param dy: Offset in y direction
+    :param dx: Offset in x direction
+    :return: SkeletonChains
+    """
+    offset = np.array([dy, dx])
+
+    def move(point):
+        return None if point is None else (point[0] + dy, point[1] + dx)
+
+    return SkeletonChains(
+        paths=[(chain + offset, move(start_junction), move(end_junction))
+               for chain, start_junction, end_junction in chains.paths],
+        junction_paths=[[move(point) for point in path] for path in chains.junction_paths],
+        circles=[chain + offset for chain in chains.circles],
+        ep_next_to_junction={move(point) for point in chains.ep_next_to_junction},
+        junction_path_keys=[move(point) for point in chains.junction_path_keys],
+        circle_keys=[move(point) for point in chains.circle_keys])
+
+
+def merge_chains(list_of_chains):
+    """
+    Merges the chains of disjoint parts of a skeleton (e.g. its connected components, traced separately) in the order
+    skeleton_to_chains gives for the whole skeleton
+    :param list_of_chains: List of SkeletonChains in the coordinates of the whole skeleton
+    :return: SkeletonChains
+    """
+    ep_next_to_junction = set()
+    for chains in list_of_chains:
+        ep_next_to_junction.update(chains.ep_next_to_junction)
+
+    # Paths start at the endpoints next to a junction, then at the other endpoints, both sorted by (x, y)
+    def path_key(path):
+        start = tuple(path[0][0].tolist())
+        return start not in ep_next_to_junction, start[1], start[0]
+
+    paths = sorted((path for chains in list_of_chains for path in chains.paths), key=path_key)
+
+    junction_paths = sorted((key, path) for chains in list_of_chains
+                            for key, path in zip(chains.junction_path_keys, chains.junction_paths))
+    circles = sorted(((key, chain) for chains in list_of_chains
+                      for key, chain in zip(chains.circle_keys, chains.circles)), key=lambda item: item[0])
+
+    return SkeletonChains(paths=paths,
+                          junction_paths=[path for _, path in junction_paths],
+                          circles=[chain for _, chain in circles],
+                          ep_next_to_junction=ep_next_to_junction,
+                          junction_path_keys=[key for key, _ in junction_paths],
+                          circle_keys=[key for key, _ in circles])
+
+
+def skeleton_components(skeleton):
+    """
+    Splits a skeleton into its 8-connected components
+    :param skeleton: Skeleton image (0 = black/skeleton, 1 = white)
+    :return: List of (y0, x0, crop): the skeleton in the bounding box of every component (without the other
+             components) and its offset. The offsets are even: the junction centroids are rounded half to even, which
+             only keeps shifts by even offsets.
+    """
+    labels, _ = measurements.label(invert_image(skeleton), structure=np.ones((3, 3)))
+    components = list()
+    for label, (rows, cols) in enumerate(measurements.find_objects(labels), 1):
+        y0, x0 = rows.start & ~1, cols.start & ~1
+        crop = np.ones((rows.stop - y0, cols.stop - x0), dtype=np.uint8)
+        crop[labels[y0:rows.stop, x0:cols.stop] == label] = 0
+        components.append((y0, x0, crop))
+    return components
+
+
+def trace_component(component):
+    """
+    :param component: (y0, x0, crop), see skeleton_components
+    :return: SkeletonChains of the component in the coordinates of the whole skeleton
+    """
+    y0, x0, crop = component
+    return translate_chains(skeleton_to_chains(crop), y0, x0)
+
+
+def trace_components(components, pool=None):
+    """
+    Traces skeleton components, optionally in parallel, and merges their chains in the order of skeleton_to_chains for
+    the whole skeleton
+    :param components: List of (y0, x0, crop), see skeleton_components
+    :param pool: Object with a map method (multiprocessing.Pool, multiprocessing.pool.ThreadPool, a concurrent.futures
+                 executor), or None to trace in this thread
+    :return: SkeletonChains
+    """
+    # Largest components first, so that no worker gets a large one at the end; the merge restores the order
+    components = sorted(components, key=lambda component: component[2].size, reverse=True)
+    traced = pool.map(trace_component, components) if pool is not None else map(trace_component, components)
+    return merge_chains(list(traced))
+
+
+def skeleton_to_chains_by_component(skeleton, pool=None):
+    """
+    Same result as skeleton_to_chains, but every connected component is traced separately, e.g. in a pool
+    :param pool: See trace_components
+    :return: SkeletonChains
+    """
+    return trace_components(skeleton_components(skeleton), pool=pool)
+
+
+def chains_to_paths(chains, step_length):
+    """
+    Samples traced skeleton chains at step_length
+    :param chains: SkeletonChains (see skeleton_to_chains)
+    :param step_length: Arc length between two sampled points
+    :return: List of paths, the same as skeleton_to_paths(skeleton, step_length)
+    """
+    list_of_paths = list()
+    for chain, start_junction, end_junction in chains.paths:
+        path = chain_to_points(sample_chain(chain, step_length))
+        if start_junction is not None:
+            path.insert(0, start_junction)
+        if end_junction is not None:
+            path.append(end_junction)
+        list_of_paths.append(path)
+
+    list_of_paths.extend(list(path) for path in chains.junction_paths)
 
     # Add circle paths
-    for cs in circle_start_points:
-        path, temp_img = find_path(img=temp_img, start_point=cs, step_length=step_length)
+    for chain in chains.circles:
+        path = chain_to_points(sample_chain(chain, step_length))
         # Build circle: Replace last element of path with the start element to create a circle
         path = path[:-1] + path[0:1]
         list_of_paths.append(path)
 
-    list_of_paths = [[point for point in path if point not in ep_next_to_junction] for path in list_of_paths]
+    list_of_paths = [[point for point in path if point not in chains.ep_next_to_junction] for path in list_of_paths]
 
     return list_of_paths
 
 
-def create_graph_from_paths(list_of_paths, **kwargs):
-    # create set of nodes:
-    points = sorted(list({point for path in list_of_paths for point in path}),
-                    key=lambda element: (element[1], element[0]))
-    node_id_to_point = {node_id: point for node_id, point in enumerate(points)}
-    point_to_node_id = {point: node_id for node_id, point in node_id_to_point.items()}
-    list_of_id_paths = [[point_to_node_id[point] for point in path] for path in list_of_paths]
-
-    # print("\n\n==== PATHS: =========================\n")
-    # pprint(list_of_id_paths)
-
-    graph = nx.Graph(**kwargs)
-
-    # Add all nodes
-    pos_of_nodes = {node_id: (x, y) for node_id, (y, x) in node_id_to_point.items()}
-    for node_id, pos in pos_of_nodes.items():
-        graph.add_node(node_id, pos=pos)
-
-    # Add all edges
-    for path in list_of_id_paths:
-        for v, w in pairwise(path):
-            graph.add_edge(v, w)
-    graph = graph.to_undirected()
-
-    return graph
+def skeleton_to_chains_in_pool(skeleton, pool=None):
+    """skeleton_to_chains, or skeleton_to_chains_by_component if a pool is given"""
+    return skeleton_to_chains(skeleton) if pool is None else skeleton_to_chains_by_component(skeleton, pool=pool)
+
+
+def skeleton_to_paths(skeleton, step_length, pool=None):
+    """
+    :param pool: Trace the connected components in this pool, see trace_components (None = whole skeleton at once)
+    """
+    return chains_to_paths(skeleton_to_chains_in_pool(skeleton, pool=pool), step_length)
+
+
+def skeleton_to_paths_for_step_lengths(skeleton, step_lengths, pool=None):
+    """
+    Traces the skeleton once and samples the chains for every step length
+    :param skeleton: Skeleton image (0 = black/skeleton, 1 = white)
+    :param step_lengths: List of step lengths
+    :param pool: See skeleton_to_paths
+    :return: List of paths for every step length (in the order of step_lengths)
+    """
+    chains = skeleton_to_chains_in_pool(skeleton, pool=pool)
+    return [chains_to_paths(chains, step_length) for step_length in step_lengths]
+
+
+def scale_paths(list_of_paths, factor, shape):
+    """
+    Maps paths of an image downsampled by factor (see binarize_manager.downsample) back to the original image: every
+    point goes to the center of its factor x factor block (rounded down for even factors). The last block row and column
+    are only partly inside the image if its size is not a multiple of factor, their points are clipped to the image.
+    :param shape: Shape (height, width) of the original image
+    :return: List of paths with (y, x) points in original image coordinates
+    """
+    if factor == 1:
+        return list_of_paths
+    offset = factor // 2
+    max_y, max_x = shape[0] - 1, shape[1] - 1
+    return [[(min(y * factor + offset, max_y), min(x * factor + offset, max_x)) for y, x in path]
+            for path in list_of_paths]
+
+
+def create_keypoint_graph_from_paths(list_of_paths, merge_radius=0, step_length=None, **kwargs):
+    """
+    Array-backed graph of the paths, with the same node ids, positions and edges as create_graph_from_paths
+    :param list_of_paths: List of paths (lists of (y, x) points)
+    :param merge_radius: Merge nodes within this distance in pixels, see merge_close_nodes (0 = only nodes at the same
+                         pixel)
+    :param step_length: Step length the paths were sampled with, merge_radius must be smaller (None = not checked)
+    :param kwargs: Graph attributes
+    :return: KeypointGraph
+    """
+    if step_length is not None:
+        check_merge_radius(merge_radius, step_length)
+    points = np.array([point for path in list_of_paths for point in path], dtype=np.intp).reshape(-1, 2)
+    if not len(points):
+        return KeypointGraph(np.zeros((0, 2), dtype=np.intp), np.zeros((0, 2), dtype=np.intp), **kwargs)
+
+    # Nodes sorted by (x, y)
+    positions, node_ids = np.unique(points[:, ::-1], axis=0, return_inverse=True)
+    node_ids = node_ids.ravel()
+
+    # Consecutive points of every path, without the pairs across two paths
+    path_starts = np.cumsum([len(path) for path in list_of_paths])[:-1]
+    path_starts = path_starts[(path_starts > 0) & (path_starts < len(node_ids))]
+    consecutive = np.ones(len(node_ids) - 1, dtype=bool)
+    consecutive[path_starts - 1] = False
+    v = node_ids[:-1][consecutive]
+    w = node_ids[1:][consecutive]
+
+    # Each undirected edge once, in the order it is first added
+    _, first = np.unique(np.minimum(v, w) * len(positions) + np.maximum(v, w), return_index=True)
+    first.sort()
+    edges = np.stack((v[first], w[first]), axis=1)
+
+    graph = KeypointGraph(positions, edges, **kwargs)
+    return merge_close_nodes(graph, merge_radius) if merge_radius > 0 else graph
+
+
+def create_graph_from_paths(list_of_paths, merge_radius=0, step_length=None, **kwargs):
+    return create_keypoint_graph_from_paths(list_of_paths, merge_radius=merge_radius, step_length=step_length,
+                                            **kwargs).to_networkx()
+
+
+def check_merge_radius(merge_radius, step_length):
+    """
+    Raises a ValueError if merge_radius would merge consecutive points of the paths sampled with step_length
+    """
+    if not 0 <= merge_radius < step_length:
+        raise ValueError("merge_radius must be at least 0 and smaller than the step length {step_length} "
+                         "[merge_radius={merge_radius}]".format(step_length=step_length, merge_radius=merge_radius))
+
+
+def merge_close_nodes(graph, radius, step_length=None):
+    """
+    Merges nodes within radius of each other, e.g. a junction centroid and a path end point a pixel apart. The nodes
+    are visited by decreasing degree (the lowest node id on ties); every node that is not merged yet becomes the
+    representative of the not yet merged nodes within radius of it (found with a spatial index), and keeps its
+    position. So no node is moved farther than radius, also where close nodes form a chain along a stroke. The edges
+    are rewired to the representatives, edges inside a group are removed.
+    :param graph: KeypointGraph
+    :param radius: Maximal distance in pixels (inclusive)
+    :param step_length: Step length of the paths of the graph, radius must be smaller (None = not checked)
+    :return: KeypointGraph, the remaining nodes keep their order
+    """
+    if step_length is not None:
+        check_merge_radius(radius, step_length)
+    num_nodes = graph.number_of_nodes()
+    pairs = graph.spatial_index().pairs(radius)
+    if not len(pairs):
+        return graph
+
+    # Close neighbors of every node (CSR)
+    rows = np.concatenate((pairs[:, 0], pairs[:, 1]))
+    cols = np.concatenate((pairs[:, 1], pairs[:, 0]))
+    order = np.argsort(rows, kind='mergesort')
+    neighbors = cols[order]
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=num_nodes))))
+
+    degrees = np.bincount(graph.edges.ravel(), minlength=num_nodes)
+    representative = np.arange(num_nodes)
+    merged = np.zeros(num_nodes, dtype=bool)
+    # Nodes without close neighbors stay their own representative
+    for node in np.lexsort((np.arange(num_nodes), -degrees)).tolist():
+        if merged[node] or indptr[node] == indptr[node + 1]:
+            continue
+        members = neighbors[indptr[node]:indptr[node + 1]]
+        members = members[~merged[members]]
+        representative[members] = node
+        merged[members] = True
+        merged[node] = True
+
+    keep = representative == np.arange(num_nodes)
+    num_groups = int(np.count_nonzero(keep))
+    node_map = (np.cumsum(keep) - 1)[representative]
+
+    v, w = node_map[graph.edges[:, 0]], node_map[graph.edges[:, 1]]
+    not_loop = v != w
+    v, w = v[not_loop], w[not_loop]
+    _, first = np.unique(np.minimum(v, w) * num_groups + np.maximum(v, w), return_index=True)
+    first.sort()
+    return KeypointGraph(graph.positions[keep], np.stack((v[first], w[first]), axis=1), **graph.graph)
 
 
 def write_graph_to_yaml(graph, outfile):
+    import networkx as nx
+
+    if isinstance(graph, KeypointGraph):
+        graph = graph.to_networkx()
     nx.write_yaml(graph, outfile)
 
 
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+import graph_manager
+
+
+class StageMeasurement(object):
+    """
+    Context manager that measures one pipeline stage and passes a record to the instrument callback:
+    {'stage': name, 'seconds': wall time, 'peak_bytes': peak traced memory, **info, **counts}
+
+    Counts are registered as functions and evaluated after the stage, so they are neither timed nor computed when the
+    instrumentation is switched off. The memory is only traced for callbacks made with with_peak_memory, otherwise
+    peak_bytes is None. It is also None if tracemalloc was already started by someone else, whose measurement is left
+    untouched.
+    """
+
+    def __init__(self, instrument, stage, **info):
+        self.instrument = instrument
+        self.stage = stage
+        self.info = info
+        self.count_functions = list()
+        self.trace_memory = getattr(instrument, 'trace_memory', False)
+        self.started_tracing = False
+        self.start = None
+
+    def add_counts(self, function, *args):
+        """
+        :param function: Function computing a dict of counts from args
+        """
+        self.count_functions.append((function, args))
+
+    def __enter__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        seconds = time.perf_counter() - self.start
+        peak = None
+        if self.started_tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        if exc_type is None:
+            record = {'stage': self.stage, 'seconds': seconds, 'peak_bytes': peak}
+            record.update(self.info)
+            for function, args in self.count_functions:
+                record.update((name, int(value)) for name, value in function(*args).items())
+            self.instrument(record)
+        return False
+
+
+class NoMeasurement(object):
+    """Stand-in for StageMeasurement when the instrumentation is switched off"""
+
+    def add_counts(self, function, *args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+NO_MEASUREMENT = NoMeasurement()
+
+
+def measure(instrument, stage, **info):
+    """
+    Measures a pipeline stage if an instrument callback is given:
+
+        with measure(instrument, 'skeleton') as stage:
+            skeleton = binary_to_skeleton(binary_image)
+            stage.add_counts(skeleton_counts, skeleton)
+
+    :param instrument: Function called with one record dict per stage, or None (no measurement)
+    :param stage: Stage name
+    :param info: Additional fields of the record (e.g. the image path)
+    :return: Context manager
+    """
+    if instrument is None:
+        return NO_MEASUREMENT
+    return StageMeasurement(instrument, stage, **info)
+
+
+def with_peak_memory(instrument):
+    """
+    Instrument callback that also records the peak memory of every stage. tracemalloc slows down stages with many
+    small allocations (on a 2400 x 2400 page, paths takes 0.85s instead of 0.45s and write 0.47s instead of 0.04s), so
+    the wall times of these records are not comparable with untraced ones: measure the times and the memory in
+    separate runs.
+    :param instrument: Function called with one record dict per stage
+    :return: Callback function
+    """
+    def record(stage_record):
+        instrument(stage_record)
+
+    record.trace_memory = True
+    return record
+
+
+def black_pixels(image):
+    """Number of black pixels (0/False) of a binary image or skeleton"""
+    return image.size - np.count_nonzero(image)
+
+
+def ink_counts(binary_image):
+    return {'ink_pixels': black_pixels(binary_image)}
+
+
+def skeleton_counts(skeleton):
+    endpoints, junctions, _ = graph_manager.get_endpoints_and_junctions(skeleton)
+    return {'skeleton_pixels': black_pixels(skeleton), 'endpoints': len(endpoints), 'junctions': len(junctions)}
+
+
+def paths_counts(list_of_paths):
+    return {'paths': len(list_of_paths), 'path_points': sum(len(path) for path in list_of_paths)}
+
+
+def graph_counts(graph):
+    return {'nodes': graph.number_of_nodes(), 'edges': graph.number_of_edges()}
+
+
+def json_lines_writer(f, **info):
+    """
+    Instrument callback writing every record as one json line
+    :param f: File object
+    :param info: Fields added to every record (e.g. the image path)
+    :return: Callback function
+    """
+    def write(record):
+        line = dict(info)
+        line.update(record)
+        f.write(json.dumps(line, sort_keys=True) + '\n')
+        f.flush()
+
+    return write
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+class KeypointGraph(object):
+    """
+    Keypoint graph backed by arrays instead of networkx
+    positions: (n, 2) array, node i is at positions[i] = (x, y)
+    edges: (m, 2) array of node index pairs, every undirected edge once, in the order the edges were first added
+    graph: dict of graph attributes (like networkx' graph.graph)
+    """
+
+    def __init__(self, positions, edges, **attr):
+        self.positions = positions
+        self.edges = edges
+        self.graph = dict(attr)
+
+    def number_of_nodes(self):
+        return len(self.positions)
+
+    def number_of_edges(self):
+        return len(self.edges)
+
+    def adjacency(self):
+        """
+        CSR adjacency, the neighbors of node u are indices[indptr[u]:indptr[u + 1]], in the order the edges were
+        added (the neighbor order of the equivalent networkx graph)
+        :return: (indptr, indices)
+        """
+        num_nodes = self.number_of_nodes()
+        a, b = self.edges[:, 0], self.edges[:, 1]
+        not_loop = a != b
+        rows = np.concatenate((a, b[not_loop]))
+        cols = np.concatenate((b, a[not_loop]))
+        time = np.concatenate((np.arange(len(a)), np.flatnonzero(not_loop)))
+
+        order = np.lexsort((time, rows))
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=num_nodes))))
+        return indptr, cols[order]
+
+    def gxl_edges(self):
+        """
+        Every undirected edge once, in the order graph_converter.unique_edges gives for the equivalent networkx graph
+        (edges grouped by their lower node, groups in the order in which the nodes are first seen while iterating the
+        adjacency), so that the GXL output does not depend on which graph type was written
+        :return: (m, 2) array of node index pairs
+        """
+        num_nodes = self.number_of_nodes()
+        indptr, indices = self.adjacency()
+        rows = np.repeat(np.arange(num_nodes), np.diff(indptr))
+        position = np.arange(len(indices)) - indptr[rows]
+
+        # Visiting the k-th neighbor v of node u first touches v, then u: event keys (u, 2k) and (u, 2k + 1)
+        touched_rows = np.flatnonzero(np.diff(indptr))
+        touched = np.concatenate((indices, touched_rows))
+        event_row = np.concatenate((rows, touched_rows))
+        event_position = np.concatenate((2 * position, np.ones(len(touched_rows), dtype=position.dtype)))
+        events = np.lexsort((event_position, event_row))
+        _, first_event = np.unique(touched[events], return_index=True)
+        first_touch = np.zeros(num_nodes, dtype=np.intp)
+        first_touch[np.unique(touched)] = first_event
+
+        lower = indices >= rows
+        group_order = np.argsort(first_touch[rows[lower]], kind='mergesort')
+        return np.stack((rows[lower], indices[lower]), axis=1)[group_order]
+
+    def spatial_index(self):
+        """
+        :return: spatial_index.SpatialIndex over the node positions (radius and nearest neighbor queries)
+        """
+        from spatial_index import SpatialIndex
+
+        return SpatialIndex(self.positions)
+
+    def to_networkx(self):
+        """
+        :return: networkx graph with the same nodes (pos=(x, y)), edges, edge order and graph attributes
+        """
+        import networkx as nx
+
+        graph = nx.Graph(**self.graph)
+        graph.add_nodes_from((node_id, {'pos': tuple(pos)}) for node_id, pos in enumerate(self.positions.tolist()))
+        graph.add_edges_from(self.edges.tolist())
+        return graph
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import traceback
+
+import cache_manager
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Batch parameters that do not change the outputs
+IGNORED_PARAMS = ('cache_dir', 'cache_bytes', 'stats', 'stats_memory', 'low_memory', 'workspace')
+
+# Entry fields that decide whether an output is up to date (size and modification time only avoid hashing)
+ENTRY_KEYS = ('input', 'input_hash', 'params', 'code_version', 'outputs')
+
+
+def output_params(params):
+    """Parameters that determine the outputs, as stored in the manifest"""
+    return {name: value for name, value in params.items() if name not in IGNORED_PARAMS}
+
+
+def load_manifest(output_dir):
+    """
+    :return: (entries, root): dict output file name (relative to output_dir) -> entry (input, input_hash, size,
+             mtime_ns, params, code_version, outputs), empty if there is no manifest in output_dir, and the input root
+             the output names are relative to (absolute path, None if there is no manifest or it has no root)
+    """
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return dict(), None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        return dict(), None
+    return manifest['entries'], manifest.get('root')
+
+
+def save_manifest(output_dir, entries, root):
+    """Writes the manifest atomically (a crash leaves the old or the new manifest)"""
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'root': root, 'entries': entries}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_FILE))
+
+
+def input_entry(infile, old_entry=None):
+    """
+    Content hash, size and modification time of an input file. The file is only hashed if its size or modification
+    time differ from old_entry.
+    :return: Dict (input, input_hash, size, mtime_ns)
+    """
+    stat = os.stat(infile)
+    if old_entry is not None and old_entry['size'] == stat.st_size and old_entry['mtime_ns'] == stat.st_mtime_ns:
+        input_hash = old_entry['input_hash']
+    else:
+        input_hash = cache_manager.hash_file(infile)
+    return {'input': infile, 'input_hash': input_hash, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def plan_batch(tasks, output_dir, entries, params, version):
+    """
+    Decides which images of a batch must be processed
+    :param tasks: List of (infile, outfile, output file names relative to output_dir) with outfile in output_dir
+    :param entries: Manifest entries, see load_manifest; the entries of unchanged images are updated in place (e.g. a
+                    new modification time of a file with the same content)
+    :param params: Output parameters, see output_params
+    :param version: Code version, see cache_manager.code_version
+    :return: (todo, skipped, removed, failed): todo is a list of (infile, outfile, new manifest entry) to process,
+             skipped the list of unchanged input files, removed the list of manifest keys that are not planned (their
+             input file was deleted or is no longer passed) and failed a list of (infile, outfile, error) for inputs
+             that could not be read (e.g. missing or not readable); their entries are left unchanged
+    """
+    todo = list()
+    skipped = list()
+    failed = list()
+    for infile, outfile, outputs in tasks:
+        key = os.path.relpath(outfile, output_dir)
+        old_entry = entries.get(key)
+        try:
+            entry = dict(input_entry(infile, old_entry if old_entry and old_entry['input'] == infile else None),
+                         params=params, code_version=version, outputs=outputs)
+        except OSError:
+            failed.append((infile, outfile, traceback.format_exc()))
+            continue
+        if old_entry is not None and all(old_entry.get(name) == entry[name] for name in ENTRY_KEYS) and \
+                all(os.path.exists(os.path.join(output_dir, name)) for name in outputs):
+            entries[key] = entry
+            skipped.append(infile)
+        else:
+            todo.append((infile, outfile, entry))
+
+    planned = {os.path.relpath(outfile, output_dir) for _, outfile, _ in tasks}
+    removed = sorted(key for key in entries if key not in planned)
+    return todo, skipped, removed, failed
+
+
+def remove_outputs(output_dir, entry):
+    """Deletes the output files of a manifest entry"""
+    for name in entry['outputs']:
+        path = os.path.join(output_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+# Offsets of the 8 neighbors, clockwise starting top-left. Bit i of a neighbor code is set if neighbor i is foreground.
+NEIGHBOR_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+
+# Lookup tables over all 256 neighbor codes
+NEIGHBOR_COUNT_LUT = np.array([bin(code).count('1') for code in range(256)], dtype=np.uint8)
+ENDPOINT_LUT = NEIGHBOR_COUNT_LUT == 1
+JUNCTION_LUT = NEIGHBOR_COUNT_LUT > 2
+FILL_HOLE_LUT = NEIGHBOR_COUNT_LUT >= 7
+REMOVE_SPECK_LUT = NEIGHBOR_COUNT_LUT <= 1
+
+
+def neighbor_codes(mask):
+    """
+    Encodes the 8-neighborhood of every pixel as a byte
+    :param mask: Boolean image (True = foreground), pixels outside the image count as background
+    :return: uint8 image of neighbor codes (bit i is set if NEIGHBOR_OFFSETS[i] is foreground)
+    """
+    mask = np.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    padded = np.pad(mask, 1, mode='constant', constant_values=False)
+    codes = np.zeros(mask.shape, dtype=np.uint8)
+    for bit, (dy, dx) in enumerate(NEIGHBOR_OFFSETS):
+        codes |= padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width] * np.uint8(1 << bit)
+    return codes
+
+
+def classify(mask, lut):
+    """
+    Classifies every pixel by its neighbor code
+    :param mask: Boolean image (True = foreground)
+    :param lut: Lookup table with 256 entries
+    :return: Image of lut values
+    """
+    return lut[neighbor_codes(mask)]
+
+
+def count_neighbors(mask):
+    """
+    Number of foreground neighbors of every pixel
+    :param mask: Boolean image (True = foreground)
+    :return: uint8 image of neighbor counts
+    """
+    return classify(mask, NEIGHBOR_COUNT_LUT)
+
+
+def find_pixels(mask, lut):
+    """
+    Coordinates of all foreground pixels whose neighbor code is selected by the lookup table
+    :param mask: Boolean image (True = foreground)
+    :param lut: Boolean lookup table with 256 entries
+    :return: Coordinate arrays (ys, xs) in row-major order
+    """
+    mask = np.asarray(mask, dtype=bool)
+    return np.nonzero(mask & classify(mask, lut))
+
+
+def neighbor_values(img, points):
+    """
+    Values of the 8 neighbors of many points at once
+    :param img: Image object
+    :param points: Sequence of (y, x) points or array of shape (n, 2)
+    :return: (values, inside) arrays of shape (n, 8); inside is False for neighbors outside the image
+    """
+    points = np.asarray(points, dtype=np.intp).reshape(-1, 2)
+    offsets = np.array(NEIGHBOR_OFFSETS, dtype=np.intp)
+    ys = points[:, 0:1] + offsets[:, 0]
+    xs = points[:, 1:2] + offsets[:, 1]
+    inside = (ys >= 0) & (ys < img.shape[0]) & (xs >= 0) & (xs < img.shape[1])
+    values = img[np.clip(ys, 0, img.shape[0] - 1), np.clip(xs, 0, img.shape[1] - 1)]
+    return values, inside
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import skimage.io
+
+# Colors (RGB) of the raster overlay
+EDGE_COLOR = (0, 0, 255)
+NODE_COLOR = (255, 0, 0)
+
+
+def paths_to_segments(list_of_paths):
+    """
+    :param list_of_paths: Paths as lists of (y, x) points
+    :return: (segments, points): float array (number of segments, 2, 2) of ((y0, x0), (y1, x1)) between consecutive
+             points of every path, and float array (number of points, 2) of all path points as (y, x)
+    """
+    lengths = np.array([len(path) for path in list_of_paths], dtype=np.intp)
+    if not lengths.sum():
+        return np.zeros((0, 2, 2)), np.zeros((0, 2))
+
+    points = np.concatenate([np.asarray(path, dtype=float).reshape(-1, 2) for path in list_of_paths if len(path)])
+    # A segment starts at every point except for the last point of each path
+    is_start = np.ones(len(points), dtype=bool)
+    is_start[np.cumsum(lengths[lengths > 0]) - 1] = False
+    starts = np.flatnonzero(is_start)
+    return np.stack((points[starts], points[starts + 1]), axis=1), points
+
+
+def matplotlib_adjustable():
+    """'box-forced' was needed for shared axes with a fixed aspect up to matplotlib 2.1 and removed in 3.0"""
+    import matplotlib
+    major, minor = (int(part) for part in matplotlib.__version__.split('.')[:2])
+    return 'box-forced' if (major, minor) < (2, 2) else 'box'
+
+
+def draw_paths(ax, list_of_paths, color='b', linewidth=1, markersize=50):
+    """
+    Draws all paths with one LineCollection and all points with one scatter call
+    :param ax: Matplotlib axes
+    """
+    from matplotlib.collections import LineCollection
+
+    segments, points = paths_to_segments(list_of_paths)
+    ax.add_collection(LineCollection(segments[:, :, ::-1], colors=color, linewidths=linewidth))
+    ax.scatter(points[:, 1], points[:, 0], c=color, s=markersize)
+    ax.autoscale_view()
+
+
+def draw_graph_figure(fig, img, binary_image, skeleton, list_of_paths):
+    """
+    Draws the original, binary, skeleton and graph panels into a matplotlib figure
+    """
+    import matplotlib.cm
+
+    # Figure.subplots needs matplotlib >= 2.1
+    adjustable = matplotlib_adjustable()
+    ax1 = fig.add_subplot(2, 2, 1, adjustable=adjustable)
+    ax2, ax3, ax4 = [fig.add_subplot(2, 2, index, sharex=ax1, sharey=ax1, adjustable=adjustable) for index in (2, 3, 4)]
+
+    for ax, image, title in ((ax1, img, 'Original'), (ax2, binary_image, 'Binary'), (ax3, skeleton, 'Skeleton')):
+        ax.imshow(image, cmap=matplotlib.cm.gray, interpolation='none')
+        ax.axis('tight')
+        ax.set_aspect('equal')
+        ax.set_title(title, fontsize=20)
+
+    ax4.axis('tight')
+    ax4.set_aspect('equal')
+    ax4.set_title('Graph', fontsize=20)
+    draw_paths(ax4, list_of_paths)
+
+    fig.tight_layout()
+
+
+def save_graph_figure(outfile, img, binary_image, skeleton, list_of_paths, dpi=100):
+    """
+    Writes the figure of run.display_graph to a png file without a GUI backend (Agg canvas, pyplot is not used)
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(20, 12))
+    FigureCanvasAgg(fig)
+    draw_graph_figure(fig, img, binary_image, skeleton, list_of_paths)
+    fig.savefig(outfile, dpi=dpi)
+
+
+def segment_pixels(segments):
+    """
+    Rasterizes line segments (DDA, all segments at once)
+    :param segments: Array (number of segments, 2, 2) of ((y0, x0), (y1, x1))
+    :return: Coordinate arrays (ys, xs) of the line pixels
+    """
+    start = segments[:, 0]
+    delta = segments[:, 1] - start
+    steps = np.ceil(np.abs(delta).max(axis=1)).astype(np.intp) + 1
+    segment_index = np.repeat(np.arange(len(segments)), steps)
+    position = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)
+    fraction = position / np.maximum(steps - 1, 1)[segment_index]
+    pixels = np.rint(start[segment_index] + fraction[:, np.newaxis] * delta[segment_index]).astype(np.intp)
+    return pixels[:, 0], pixels[:, 1]
+
+
+def disk_pixels(points, radius):
+    """
+    :param points: Array (number of points, 2) of (y, x)
+    :return: Coordinate arrays (ys, xs) of the pixels of a disk around every point
+    """
+    oy, ox = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    inside = oy ** 2 + ox ** 2 <= radius ** 2
+    centers = np.rint(points).astype(np.intp)
+    return (centers[:, 0, np.newaxis] + oy[inside]).ravel(), (centers[:, 1, np.newaxis] + ox[inside]).ravel()
+
+
+def set_pixels(image, ys, xs, color):
+    inside = (ys >= 0) & (ys < image.shape[0]) & (xs >= 0) & (xs < image.shape[1])
+    image[ys[inside], xs[inside]] = color
+
+
+def render_overlay(img, list_of_paths, node_radius=2, fade=0.5, edge_color=EDGE_COLOR, node_color=NODE_COLOR):
+    """
+    Rasterizes the graph over the image directly into a numpy image (no matplotlib)
+    :param img: Grey image (float in [0, 1] or uint8) or RGB image, defines the size of the overlay
+    :param list_of_paths: Paths as lists of (y, x) points
+    :param node_radius: Radius of the node disks in pixels (0 = single pixels)
+    :param fade: Blend factor of the image towards white, so the graph stands out
+    :return: RGB uint8 image
+    """
+    background = np.asarray(img, dtype=float)
+    if img.dtype == np.uint8:
+        background /= 255.0
+    if background.ndim == 3:
+        background = background[:, :, :3].mean(axis=2)
+    background = fade + (1.0 - fade) * np.clip(background, 0.0, 1.0)
+    overlay = np.repeat(np.rint(background * 255).astype(np.uint8)[:, :, np.newaxis], 3, axis=2)
+
+    segments, points = paths_to_segments(list_of_paths)
+    set_pixels(overlay, *segment_pixels(segments), color=edge_color)
+    set_pixels(overlay, *disk_pixels(points, node_radius), color=node_color)
+    return overlay
+
+
+def save_overlay(outfile, img, list_of_paths, **kwargs):
+    """
+    Writes the graph drawn over the image as png file, see render_overlay for the parameters
+    """
+    skimage.io.imsave(outfile, render_overlay(img, list_of_paths, **kwargs))
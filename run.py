@@ -2,70 +2,167 @@
 
 import os
 import argparse
+import multiprocessing
+import sys
 
-import skimage
-import matplotlib.pyplot as plt
+import skimage.io
 
 import binarize_manager
+import cache_manager
 import graph_manager
+import instrument_manager
+import render_manager
+import tile_manager
 
 
 def display_graph(img, binary_image, skeleton, list_of_paths):
+    # matplotlib takes long to import and is only needed for the display
+    import matplotlib.pyplot as plt
+
     # display results
-    fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(nrows=2, ncols=2, figsize=(20, 12),
-                                                 sharex='all', sharey='all',
-                                                 subplot_kw={'adjustable': 'box-forced'})
-    ax1.imshow(img, cmap=plt.cm.gray, interpolation='none')
-    ax1.axis('tight')
-    ax1.set_aspect('equal')
-    ax1.set_title('Original', fontsize=20)
-
-    ax2.imshow(binary_image, cmap=plt.cm.gray, interpolation='none')
-    ax2.axis('tight')
-    ax2.set_aspect('equal')
-    ax2.set_title('Binary', fontsize=20)
-
-    ax3.imshow(skeleton, cmap=plt.cm.gray, interpolation='none')
-    ax3.axis('tight')
-    ax3.set_aspect('equal')
-    ax3.set_title('Skeleton', fontsize=20)
-
-    # ax4.imshow(skeleton, cmap=plt.cm.gray, interpolation='none')
-    ax4.axis('tight')
-    ax4.set_aspect('equal')
-    ax4.set_title('Graph', fontsize=20)
-    for path in list_of_paths:
-        ax4.plot(*reversed(list(zip(*path))), c='b', linewidth=1)
-        ax4.scatter(*reversed(list(zip(*path))), c='b', s=50)
-
-    fig.tight_layout()
+    fig = plt.figure(figsize=(20, 12))
+    render_manager.draw_graph_figure(fig, img, binary_image, skeleton, list_of_paths)
 
     plt.show()
 
 
-def create_graph_example(path_img, sigma1=1, sigma2=30, threshold=0.87, step_length=25):
+def create_skeleton_example(path_img, sigma1=1, sigma2=30, threshold=0.87, blur='exact', cache=None, instrument=None,
+                            workspace=None, downsample=1, passes=3):
+    """
+    Loads an image and computes its binary image and skeleton
+    :param passes: Number of box filter passes for blur='box', see binarize_manager.gaussian_blur
+    :param instrument: Function called with a record (wall time, peak memory, counts) per stage, see instrument_manager
+    :param workspace: binarize_manager.Workspace for the low-memory mode (same results, bool binary image and uint8
+                      skeleton), can be reused for all images of a batch
+    :param downsample: Compute the binary image and the skeleton at 1 / downsample of the resolution (integer factor,
+                       see binarize_manager.downsample); sigma1 and sigma2 are given for the original image and are
+                       scaled accordingly
+    :return: (img, binary_image, skeleton, skeleton_key), skeleton_key is the cache key of the skeleton (or None); img
+             has the original resolution, binary_image and skeleton the reduced one
+    """
     # Load image
-    with open(path_img, "rb") as f_in:
-        img = skimage.io.imread(f_in, as_grey=True)
+    with instrument_manager.measure(instrument, 'imread') as stage:
+        with open(path_img, "rb") as f_in:
+            img = skimage.io.imread(f_in, as_grey=True)
+        image_hash = cache_manager.hash_file(path_img) if cache is not None else None
+        stage.add_counts(lambda: {'pixels': img.size})
 
     # Binary
-    binary_image = binarize_manager.img_to_binary(img, sigma1=sigma1, sigma2=sigma2, threshold=threshold)
-    binary_image = binarize_manager.fix_small_holes(binary_image)
+    with instrument_manager.measure(instrument, 'binary') as stage:
+        binary_key, binary_image = cache_manager.cached_stage(
+            cache, 'binary', image_hash,
+            dict(sigma1=sigma1, sigma2=sigma2, threshold=threshold, blur=blur, passes=passes, downsample=downsample,
+                 low_memory=workspace is not None),
+            cache_manager.IMAGE_CODEC,
+            lambda: binarize_manager.fix_small_holes(
+                binarize_manager.img_to_binary(binarize_manager.downsample(img, downsample), sigma1=sigma1 / downsample,
+                                               sigma2=sigma2 / downsample, threshold=threshold, blur=blur,
+                                               passes=passes, workspace=workspace), in_place=workspace is not None))
+        stage.add_counts(instrument_manager.ink_counts, binary_image)
 
     # Skeleton
-    skeleton = binarize_manager.binary_to_skeleton(binary_image)
+    with instrument_manager.measure(instrument, 'skeleton') as stage:
+        skeleton_key, skeleton = cache_manager.cached_stage(
+            cache, 'skeleton', binary_key, dict(), cache_manager.IMAGE_CODEC,
+            lambda: binarize_manager.binary_to_skeleton(binary_image, low_memory=workspace is not None))
+        stage.add_counts(instrument_manager.skeleton_counts, skeleton)
+
+    return img, binary_image, skeleton, skeleton_key
+
+
+def create_graph_example(path_img, sigma1=1, sigma2=30, threshold=0.87, step_length=25, blur='exact', cache=None,
+                         instrument=None, workspace=None, merge_radius=0, pool=None, downsample=1, passes=3):
+    """
+    :param downsample: Fast path for high-resolution images: trace the graph at 1 / downsample of the resolution
+                       (see create_skeleton_example, step_length is scaled too) and map the paths back to the original
+                       image coordinates, see graph_manager.scale_paths (1 = full resolution)
+    :return: (img, binary_image, skeleton, list_of_paths, graph); graph is a KeypointGraph, not a networkx graph as in
+             former versions: use graph.to_networkx() for the networkx graph
+    """
+    img, binary_image, skeleton, skeleton_key = create_skeleton_example(path_img, sigma1=sigma1, sigma2=sigma2,
+                                                                        threshold=threshold, blur=blur, cache=cache,
+                                                                        instrument=instrument, workspace=workspace,
+                                                                        downsample=downsample, passes=passes)
 
     # Graph
-    list_of_paths = graph_manager.skeleton_to_paths(skeleton, step_length=step_length)
-    graph = graph_manager.create_graph_from_paths(list_of_paths)
+    with instrument_manager.measure(instrument, 'paths') as stage:
+        _, list_of_paths = cache_manager.cached_stage(
+            cache, 'paths', skeleton_key, dict(step_length=step_length), cache_manager.PATHS_CODEC,
+            lambda: graph_manager.skeleton_to_paths(skeleton, step_length=step_length / downsample, pool=pool))
+        list_of_paths = graph_manager.scale_paths(list_of_paths, downsample, img.shape[:2])
+        stage.add_counts(instrument_manager.paths_counts, list_of_paths)
+
+    with instrument_manager.measure(instrument, 'graph') as stage:
+        graph = graph_manager.create_keypoint_graph_from_paths(list_of_paths, merge_radius=merge_radius,
+                                                               step_length=step_length)
+        stage.add_counts(instrument_manager.graph_counts, graph)
 
     return img, binary_image, skeleton, list_of_paths, graph
-    
 
-def convert_to_binary(infile, outfile, sigma1=1, sigma2=30, threshold=0.87):
+
+def image_to_graph(img, sigma1=1, sigma2=30, threshold=0.87, step_length=25, blur='exact', workspace=None,
+                   merge_radius=0, pool=None, downsample=1, passes=3):
+    """
+    Graph of an already loaded image (without cache and instrumentation, e.g. for images that are not files)
+    :param workspace: binarize_manager.Workspace for the low-memory mode, see create_skeleton_example
+    :param merge_radius: Merge nodes within this distance, see graph_manager.merge_close_nodes (0 = no merge)
+    :param pool: Trace the connected components of the skeleton in this pool, see graph_manager.trace_components
+    :param downsample: Trace at 1 / downsample of the resolution, see create_graph_example
+    :param passes: Number of box filter passes for blur='box', see binarize_manager.gaussian_blur
+    :return: (list_of_paths, graph), graph is a KeypointGraph (graph.to_networkx() for the networkx graph)
+    """
+    binary_image = binarize_manager.fix_small_holes(
+        binarize_manager.img_to_binary(binarize_manager.downsample(img, downsample), sigma1=sigma1 / downsample,
+                                       sigma2=sigma2 / downsample, threshold=threshold, blur=blur, passes=passes,
+                                       workspace=workspace), in_place=workspace is not None)
+    skeleton = binarize_manager.binary_to_skeleton(binary_image, low_memory=workspace is not None)
+    list_of_paths = graph_manager.scale_paths(
+        graph_manager.skeleton_to_paths(skeleton, step_length=step_length / downsample, pool=pool), downsample,
+        img.shape[:2])
+    return list_of_paths, graph_manager.create_keypoint_graph_from_paths(list_of_paths, merge_radius=merge_radius,
+                                                                         step_length=step_length)
+
+
+def create_graphs_for_step_lengths(path_img, step_lengths, sigma1=1, sigma2=30, threshold=0.87, blur='exact',
+                                   cache=None, instrument=None, workspace=None, merge_radius=0, pool=None, passes=3,
+                                   downsample=1):
+    """
+    Like create_graph_example for several step lengths, but the skeleton is traced only once
+    :param downsample: Trace at 1 / downsample of the resolution, see create_graph_example
+    :return: (img, binary_image, skeleton, list of list_of_paths, list of graphs), one entry per step length; the graphs
+             are KeypointGraphs (graph.to_networkx() for the networkx graph)
+    """
+    img, binary_image, skeleton, _ = create_skeleton_example(path_img, sigma1=sigma1, sigma2=sigma2,
+                                                             threshold=threshold, blur=blur, cache=cache,
+                                                             instrument=instrument, workspace=workspace,
+                                                             downsample=downsample, passes=passes)
+
+    with instrument_manager.measure(instrument, 'chains') as stage:
+        chains = graph_manager.skeleton_to_chains_in_pool(skeleton, pool=pool)
+        stage.add_counts(lambda: {'chains': len(chains.paths) + len(chains.circles)})
+
+    all_paths = list()
+    graphs = list()
+    for step_length in step_lengths:
+        with instrument_manager.measure(instrument, 'paths', step_length=step_length) as stage:
+            list_of_paths = graph_manager.scale_paths(graph_manager.chains_to_paths(chains, step_length / downsample),
+                                                      downsample, img.shape[:2])
+            stage.add_counts(instrument_manager.paths_counts, list_of_paths)
+        with instrument_manager.measure(instrument, 'graph', step_length=step_length) as stage:
+            graph = graph_manager.create_keypoint_graph_from_paths(list_of_paths, merge_radius=merge_radius,
+                                                                   step_length=step_length)
+            stage.add_counts(instrument_manager.graph_counts, graph)
+        all_paths.append(list_of_paths)
+        graphs.append(graph)
+
+    return img, binary_image, skeleton, all_paths, graphs
+
+
+def convert_to_binary(infile, outfile, sigma1=1, sigma2=30, threshold=0.87, blur='exact', passes=3):
     with open(infile, "rb") as f_in:
         img = skimage.io.imread(f_in, as_grey=True)
-    binary_image = binarize_manager.img_to_binary(img, sigma1=sigma1, sigma2=sigma2, threshold=threshold)
+    binary_image = binarize_manager.img_to_binary(img, sigma1=sigma1, sigma2=sigma2, threshold=threshold, blur=blur,
+                                                  passes=passes)
     binarize_manager.write_binary_file(binary_image=binary_image, outfile=outfile)
 
 
@@ -74,15 +171,57 @@ def main():
     parser.add_argument('-i', '--input', help='Path to input image', required=True)
     parser.add_argument('-d', '--display', action='store_true', help='Display output (default: False)', required=False)
     parser.add_argument('-o', '--output', help='Path to output file', required=False)
+    parser.add_argument('-r', '--render',
+                        help='Write the display (original, binary, skeleton, graph) to this png file, without a GUI',
+                        required=False)
+    parser.add_argument('--overlay', help='Write the graph drawn over the image to this png file', required=False)
+    parser.add_argument('-b', '--blur', choices=binarize_manager.BLUR_MODES, default='exact',
+                        help='Gaussian blur backend for the binarization (default: exact)', required=False)
+    parser.add_argument('--passes', type=int, default=3,
+                        help='Number of box filter passes for -b box, more passes are closer to exact (default: 3)',
+                        required=False)
+    parser.add_argument('-c', '--cache', help='Directory for caching intermediate results', required=False)
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help='Size limit of the cache in MiB (default: 1024)', required=False)
+    parser.add_argument('-m', '--low-memory', action='store_true',
+                        help='Filter in float32 and keep uint8 images to reduce the memory (default: False)',
+                        required=False)
+    parser.add_argument('--merge-radius', type=float, default=0,
+                        help='Merge graph nodes within this distance in pixels, smaller than the step length 10 '
+                             '(default: 0, only nodes at the same pixel)', required=False)
+    parser.add_argument('--downsample', type=int, default=1,
+                        help='Trace the graph at 1/DOWNSAMPLE of the resolution and map the nodes back to the image '
+                             '(default: 1, full resolution)', required=False)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Trace the connected strokes of the skeleton in this many processes (default: 1)',
+                        required=False)
+    parser.add_argument('-s', '--stats',
+                        help='Write wall time and counts of every stage as json lines to this file '
+                             '("-" for stdout)', required=False)
+    parser.add_argument('--stats-memory', action='store_true',
+                        help='With -s/--stats, also trace the peak memory of every stage (tracemalloc slows down the '
+                             'stages, up to ten times, so the wall times are not comparable; default: False)',
+                        required=False)
+    parser.add_argument('-t', '--tile-size', type=int, default=None,
+                        help='Binarize and skeletonize large images in tiles of this size (default: no tiles)',
+                        required=False)
 
     args = parser.parse_args()
 
-    if not args.display and not args.output:
-        print('You should have -d/--display ("display output") or -o/--output ("path to output file") specified.')
+    if not (args.display or args.output or args.render or args.overlay):
+        print('You should have -d/--display ("display output"), -o/--output ("path to output file"), -r/--render or '
+              '--overlay ("path to png file") specified.')
         print('Otherwise, there is nothing to do. Canceling...')
         print('[Use -h/--help for help.]')
         exit()
 
+    try:
+        graph_manager.check_merge_radius(args.merge_radius, 10)
+    except ValueError as e:
+        print(e)
+        print('[Use -h/--help for help.]')
+        exit()
+
     path_img = args.input
     if not path_img:
         print('No input file specified (-i/--input).')
@@ -94,17 +233,63 @@ def main():
         print('[Use -h/--help for help.]')
         exit()
 
-    img, binary_image, skeleton, list_of_paths, graph = create_graph_example(path_img,
-                                                                             sigma1=1, sigma2=30, threshold=0.87,
-                                                                             step_length=10)
-    
+    if args.tile_size and (args.display or args.render or args.cache or args.downsample != 1):
+        print('-t/--tile-size does not keep the full binary image, so it cannot be combined with -d/--display, '
+              '-r/--render, -c/--cache or --downsample.')
+        print('[Use -h/--help for help.]')
+        exit()
+
+    stats_file = None
+    instrument = None
+    if args.stats:
+        stats_file = sys.stdout if args.stats == '-' else open(args.stats, 'a')
+        instrument = instrument_manager.json_lines_writer(stats_file, image=path_img)
+        if args.stats_memory:
+            instrument = instrument_manager.with_peak_memory(instrument)
+
+    workspace = binarize_manager.Workspace() if args.low_memory else None
+    pool = multiprocessing.Pool(args.jobs) if args.jobs > 1 else None
+    if args.tile_size:
+        img, _, list_of_paths, graph = tile_manager.create_graph_tiled(path_img, sigma1=1, sigma2=30, threshold=0.87,
+                                                                       step_length=10, blur=args.blur,
+                                                                       passes=args.passes,
+                                                                       tile_size=args.tile_size, instrument=instrument,
+                                                                       workspace=workspace,
+                                                                       merge_radius=args.merge_radius, pool=pool)
+    else:
+        cache = cache_manager.StageCache(args.cache, max_bytes=args.cache_size << 20) if args.cache else None
+        img, binary_image, skeleton, list_of_paths, graph = create_graph_example(path_img,
+                                                                                 sigma1=1, sigma2=30, threshold=0.87,
+                                                                                 step_length=10, blur=args.blur,
+                                                                                 passes=args.passes,
+                                                                                 cache=cache, instrument=instrument,
+                                                                                 workspace=workspace,
+                                                                                 merge_radius=args.merge_radius,
+                                                                                 pool=pool, downsample=args.downsample)
+        if cache is not None:
+            print('Cache: {}'.format(cache.report()))
+    if pool is not None:
+        pool.close()
+
     if args.display:
         print('Displaying output images and graph')
         display_graph(img, binary_image, skeleton, list_of_paths)
 
+    if args.render:
+        print('Write display to "{}"'.format(args.render))
+        render_manager.save_graph_figure(args.render, img, binary_image, skeleton, list_of_paths)
+
+    if args.overlay:
+        print('Write overlay to "{}"'.format(args.overlay))
+        render_manager.save_overlay(args.overlay, img, list_of_paths)
+
     if args.output:
         print('Write output to "{}"'.format(args.output))
-        graph_manager.write_graph_to_gxl(graph=graph, outfile=args.output)
+        with instrument_manager.measure(instrument, 'write'):
+            graph_manager.write_graph_to_gxl(graph=graph, outfile=args.output)
+
+    if stats_file is not None and stats_file is not sys.stdout:
+        stats_file.close()
 
 
 if __name__ == '__main__':
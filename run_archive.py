@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+
+import archive_manager
+import batch_manager
+import binarize_manager
+import graph_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Skeleton Graph Archives')
+    parser.add_argument('inputs', nargs='+', help='Input zip or tar archives with images')
+    parser.add_argument('-o', '--output', required=True,
+                        help='Output file: .zip or .tar(.gz) with one gxl-file per image, or .bin for a binary '
+                             'graph dataset')
+    parser.add_argument('-p', '--processes', type=int, default=1,
+                        help='Number of worker processes (default: 1)', required=False)
+    parser.add_argument('--prefetch', type=int, default=16,
+                        help='Number of images read ahead (per worker process) (default: 16)', required=False)
+    parser.add_argument('-b', '--blur', choices=binarize_manager.BLUR_MODES, default='exact',
+                        help='Gaussian blur backend for the binarization (default: exact)', required=False)
+    parser.add_argument('--passes', type=int, default=3,
+                        help='Number of box filter passes for -b box, more passes are closer to exact (default: 3)',
+                        required=False)
+    parser.add_argument('-m', '--low-memory', action='store_true',
+                        help='Filter in float32 and keep uint8 images to reduce the memory (default: False)',
+                        required=False)
+    parser.add_argument('--merge-radius', type=float, default=0,
+                        help='Merge graph nodes within this distance in pixels, smaller than the step length 10 '
+                             '(default: 0, only nodes at the same pixel)', required=False)
+    parser.add_argument('--downsample', type=int, default=1,
+                        help='Trace the graph at 1/DOWNSAMPLE of the resolution and map the nodes back to the image '
+                             '(default: 1, full resolution)', required=False)
+    parser.add_argument('--compact', action='store_true',
+                        help='Write gxl without indentation (default: False)', required=False)
+
+    args = parser.parse_args()
+    try:
+        graph_manager.check_merge_radius(args.merge_radius, 10)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print('Processing {} to "{}"'.format(', '.join(args.inputs), args.output))
+    results, summary = archive_manager.process_archives(args.inputs, args.output, processes=args.processes,
+                                                        prefetch_size=args.prefetch, compact=args.compact,
+                                                        sigma1=1, sigma2=30, threshold=0.87, step_length=10,
+                                                        blur=args.blur, passes=args.passes, low_memory=args.low_memory,
+                                                        merge_radius=args.merge_radius,
+                                                        downsample=args.downsample)
+    batch_manager.print_summary(results, summary)
+
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+
+import batch_manager
+import binarize_manager
+import graph_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Skeleton Graph Batch')
+    parser.add_argument('inputs', nargs='*', help='Input images, directories or glob patterns')
+    parser.add_argument('-l', '--list', action='append', default=[],
+                        help='Text file with one input image per line (can be repeated)', required=False)
+    parser.add_argument('-o', '--output', help='Output directory for the gxl-files', required=True)
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs)', required=False)
+    parser.add_argument('-c', '--chunksize', type=int, default=None,
+                        help='Number of images per task submitted to a worker (default: automatic)', required=False)
+    parser.add_argument('-b', '--blur', choices=binarize_manager.BLUR_MODES, default='exact',
+                        help='Gaussian blur backend for the binarization (default: exact)', required=False)
+    parser.add_argument('--passes', type=int, default=3,
+                        help='Number of box filter passes for -b box, more passes are closer to exact (default: 3)',
+                        required=False)
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='Only process new or changed images (see manifest.json in the output directory) and '
+                             'remove the outputs of images that were deleted or are no longer passed (default: False)',
+                        required=False)
+    parser.add_argument('--root',
+                        help='The outputs keep the path of the inputs below this directory (default: the root stored '
+                             'in the manifest of -i/--incremental, or else the common directory of the inputs)',
+                        required=False)
+    parser.add_argument('--cache', help='Directory for caching intermediate results', required=False)
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help='Size limit of the cache in MiB (default: 1024)', required=False)
+    parser.add_argument('-m', '--low-memory', action='store_true',
+                        help='Filter in float32 and keep uint8 images to reduce the memory (default: False)',
+                        required=False)
+    parser.add_argument('--merge-radius', type=float, default=0,
+                        help='Merge graph nodes within this distance in pixels, smaller than the step length 10 '
+                             '(default: 0, only nodes at the same pixel)', required=False)
+    parser.add_argument('--downsample', type=int, default=1,
+                        help='Trace the graph at 1/DOWNSAMPLE of the resolution and map the nodes back to the image '
+                             '(default: 1, full resolution)', required=False)
+    parser.add_argument('--overlay', action='store_true',
+                        help='Also write the graph drawn over the image as <image name>.overlay.png (default: False)',
+                        required=False)
+    parser.add_argument('-s', '--stats',
+                        help='Write wall time and counts of every stage and image as json lines to this file',
+                        required=False)
+    parser.add_argument('--stats-memory', action='store_true',
+                        help='With -s/--stats, also trace the peak memory of every stage (tracemalloc slows down the '
+                             'stages, up to ten times, so the wall times are not comparable; default: False)',
+                        required=False)
+
+    args = parser.parse_args()
+    try:
+        graph_manager.check_merge_radius(args.merge_radius, 10)
+    except ValueError as e:
+        parser.error(str(e))
+
+    infiles = batch_manager.collect_inputs(args.inputs, list_files=args.list)
+    if not infiles:
+        print('No input images found.')
+        print('[Use -h/--help for help.]')
+        exit()
+
+    print('Processing {} images to "{}"'.format(len(infiles), args.output))
+    try:
+        results, summary = batch_manager.process_batch(infiles, args.output,
+                                                       processes=args.processes, chunksize=args.chunksize,
+                                                       incremental=args.incremental, root=args.root,
+                                                       sigma1=1, sigma2=30, threshold=0.87, step_length=10,
+                                                       blur=args.blur, passes=args.passes, cache_dir=args.cache,
+                                                       cache_bytes=args.cache_size << 20, stats=bool(args.stats),
+                                                       stats_memory=args.stats_memory,
+                                                       low_memory=args.low_memory, overlay=args.overlay,
+                                                       merge_radius=args.merge_radius, downsample=args.downsample)
+    except ValueError as e:
+        parser.error(str(e))
+    batch_manager.print_summary(results, summary)
+    if args.stats:
+        with open(args.stats, 'w') as f:
+            batch_manager.write_stats(results, f)
+
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
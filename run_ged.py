@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+
+import ged_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Skeleton Graph Edit Distances')
+    parser.add_argument('references', help='Reference graphs: directory with gxl-files or binary graph dataset file')
+    parser.add_argument('-q', '--queries',
+                        help='Query graphs (directory or dataset file); without, all pairs of the references',
+                        required=False)
+    parser.add_argument('-o', '--output', required=True,
+                        help='Output .npy file with the distance matrix (references x queries), the graph names and '
+                             'parameters are written to <output>.json; an unfinished output is resumed')
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs)', required=False)
+    parser.add_argument('--block-size', type=int, default=64,
+                        help='Edge length of the blocks computed per task (default: 64)', required=False)
+    parser.add_argument('-u', '--upper-triangle', action='store_true',
+                        help='Without queries: compute every pair only once (default: False)', required=False)
+    parser.add_argument('--node-cost', type=float, default=1.0,
+                        help='Cost of a node deletion or insertion (default: 1.0)', required=False)
+    parser.add_argument('--edge-cost', type=float, default=1.0,
+                        help='Cost of an edge deletion or insertion (default: 1.0)', required=False)
+    parser.add_argument('--no-normalize', action='store_true',
+                        help='Use the pixel positions instead of positions normalized per graph (default: False)',
+                        required=False)
+
+    args = parser.parse_args()
+
+    if args.upper_triangle and args.queries:
+        print('-u/--upper-triangle computes the pairs of the references, it cannot be combined with -q/--queries.')
+        print('[Use -h/--help for help.]')
+        exit()
+
+    named_rows = ged_manager.load_named_graphs(args.references)
+    named_columns = ged_manager.load_named_graphs(args.queries) if args.queries else None
+    print('Computing distances of {} x {} graphs to "{}"'.format(
+        len(named_rows), len(named_columns) if named_columns is not None else len(named_rows), args.output))
+
+    def progress(finished, num_blocks):
+        print('\rBlock {}/{}'.format(finished, num_blocks), end='', flush=True)
+
+    start = time.time()
+    matrix = ged_manager.distance_matrix(named_rows, named_columns, outfile=args.output, processes=args.processes,
+                                         block_size=args.block_size, upper_triangle=args.upper_triangle,
+                                         node_cost=args.node_cost, edge_cost=args.edge_cost,
+                                         normalize=not args.no_normalize, progress=progress)
+    print('\n{} x {} distances in {:.1f}s'.format(matrix.shape[0], matrix.shape[1], time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+
+import argparse
+
+import server_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Skeleton Graph Server')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to listen on (default: 127.0.0.1)', required=False)
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)', required=False)
+    parser.add_argument('-s', '--socket', help='Serve on this Unix domain socket instead of TCP', required=False)
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs)', required=False)
+    parser.add_argument('-q', '--quiet', action='store_true', help='Do not log requests (default: False)',
+                        required=False)
+
+    args = parser.parse_args()
+
+    server = server_manager.create_server(host=args.host, port=args.port, socket_path=args.socket,
+                                          processes=args.processes, quiet=args.quiet)
+    print('Serving on {}'.format(args.socket or 'http://{}:{}'.format(*server.server_address)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+
+import http.client
+import http.server
+import io
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import threading
+import time
+import traceback
+import urllib.parse
+
+import skimage.io
+
+import binarize_manager
+import graph_converter
+import graph_manager
+import run
+
+# Output formats: content type of the response
+OUTPUT_FORMATS = {'gxl': 'application/xml', 'gxl-compact': 'application/xml', 'dataset': 'application/octet-stream'}
+
+# Extraction parameters accepted in the query string: type and default
+PARAMETERS = {'sigma1': (float, 1.0), 'sigma2': (float, 30.0), 'threshold': (float, 0.87), 'step_length': (int, 10),
+              'blur': (str, 'exact'), 'passes': (int, 3), 'merge_radius': (float, 0.0), 'downsample': (int, 1),
+              'format': (str, 'gxl'), 'name': (str, 'graph')}
+
+
+def parse_parameters(query):
+    """
+    :param query: URL query string, e.g. 'step_length=25&format=dataset'
+    :return: Dict of all PARAMETERS (defaults for the missing ones)
+    """
+    values = urllib.parse.parse_qs(query, keep_blank_values=True)
+    unknown = set(values) - set(PARAMETERS)
+    if unknown:
+        raise ValueError("unknown parameters {unknown}".format(unknown=sorted(unknown)))
+
+    params = dict()
+    for name, (type_, default) in PARAMETERS.items():
+        try:
+            params[name] = type_(values[name][-1]) if name in values else default
+        except ValueError:
+            raise ValueError("{name} must be of type {type} [{name}={value}]".format(
+                name=name, type=type_.__name__, value=values[name][-1]))
+
+    if params['format'] not in OUTPUT_FORMATS:
+        raise ValueError("format must be one of {formats} [format={format}]".format(
+            formats=sorted(OUTPUT_FORMATS), format=params['format']))
+    if params['blur'] not in binarize_manager.BLUR_MODES:
+        raise ValueError("blur must be one of {modes} [blur={blur}]".format(
+            modes=binarize_manager.BLUR_MODES, blur=params['blur']))
+    for name in ('sigma1', 'sigma2'):
+        # Also rejects nan and inf, which would give an empty graph or fail in the worker
+        if not 0 < params[name] < float('inf'):
+            raise ValueError("{name} must be a positive number [{name}={value}]".format(name=name, value=params[name]))
+    if not 0 < params['threshold'] <= 1:
+        raise ValueError("threshold must be a number between 0.0 and 1.0 [threshold={threshold}]".format(**params))
+    if params['passes'] <= 0:
+        raise ValueError("passes must be a positive integer [passes={passes}]".format(**params))
+    if params['step_length'] <= 0:
+        raise ValueError("step_length must be a positive integer [step_length={step_length}]".format(**params))
+    graph_manager.check_merge_radius(params['merge_radius'], params['step_length'])
+    if params['downsample'] <= 0:
+        raise ValueError("downsample must be a positive integer [downsample={downsample}]".format(**params))
+    return params
+
+
+def extract_graph(image_bytes, params):
+    """
+    Creates the graph of an encoded image (runs in the worker processes)
+    :param image_bytes: Content of an image file (png, jpg, ...)
+    :param params: Parameters, see parse_parameters
+    :return: Encoded graph (bytes) in params['format']
+    """
+    img = skimage.io.imread(io.BytesIO(image_bytes), as_grey=True)
+    _, graph = run.image_to_graph(img, sigma1=params['sigma1'], sigma2=params['sigma2'], threshold=params['threshold'],
+                                  step_length=params['step_length'], blur=params['blur'], passes=params['passes'],
+                                  merge_radius=params['merge_radius'], downsample=params['downsample'])
+
+    if params['format'] == 'dataset':
+        f = io.BytesIO()
+        graph_converter.dump_array_dataset(f, [(params['name'],) + graph_converter.graph_to_arrays(graph)])
+        return f.getvalue()
+
+    f = io.StringIO()
+    graph_converter.write_gxl(f, graph, params['name'], compact=params['format'] == 'gxl-compact')
+    return f.getvalue().encode('utf-8')
+
+
+def run_extraction(task):
+    """Pool task: (image_bytes, params) -> (error message or None, encoded graph, seconds)"""
+    image_bytes, params = task
+    start = time.time()
+    try:
+        return None, extract_graph(image_bytes, params), time.time() - start
+    except Exception:
+        return traceback.format_exc(), b'', time.time() - start
+
+
+class GraphRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    POST /graph?<parameters> with the image file as body returns the graph, GET /status returns the server statistics
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # Clients of a Unix domain socket have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def send_body(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_text(self, status, message):
+        self.send_body(status, 'text/plain; charset=utf-8', message.encode('utf-8'))
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path != '/status':
+            self.send_error_text(404, 'Not found: {}'.format(self.path))
+            return
+        with self.server.stats_lock:
+            stats = json.dumps(self.server.stats, sort_keys=True)
+        self.send_body(200, 'application/json', stats.encode('utf-8'))
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        image_bytes = self.rfile.read(length)
+        if url.path != '/graph':
+            self.send_error_text(404, 'Not found: {}'.format(self.path))
+            return
+
+        try:
+            params = parse_parameters(url.query)
+        except ValueError as e:
+            self.send_error_text(400, str(e))
+            return
+        if not image_bytes:
+            self.send_error_text(400, 'No image in the request body')
+            return
+
+        error, body, seconds = self.server.pool.apply(run_extraction, ((image_bytes, params),))
+        self.server.count_request(error, seconds)
+        if error:
+            self.send_error_text(500, error)
+        else:
+            self.send_body(200, OUTPUT_FORMATS[params['format']], body)
+
+
+class GraphServerMixIn(socketserver.ThreadingMixIn):
+    """Serves every connection in a thread, the extraction itself runs in a pool of worker processes"""
+    daemon_threads = True
+
+    def setup_server(self, processes, quiet):
+        self.pool = multiprocessing.Pool(processes)
+        self.quiet = quiet
+        self.stats = {'requests': 0, 'failed': 0, 'seconds': 0.0, 'processes': processes}
+        self.stats_lock = threading.Lock()
+
+    def count_request(self, error, seconds):
+        with self.stats_lock:
+            self.stats['requests'] += 1
+            self.stats['failed'] += int(bool(error))
+            self.stats['seconds'] += seconds
+
+    def server_close(self):
+        super().server_close()
+        self.pool.terminate()
+        self.pool.join()
+
+
+class TCPGraphServer(GraphServerMixIn, http.server.HTTPServer):
+    pass
+
+
+class UnixGraphServer(GraphServerMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+def create_server(host='127.0.0.1', port=8080, socket_path=None, processes=None, quiet=False):
+    """
+    Creates a graph extraction server, run it with serve_forever()
+    :param host: Host for HTTP over TCP
+    :param port: Port for HTTP over TCP (0 = any free port)
+    :param socket_path: Path of a Unix domain socket; if given, HTTP is served on it instead of TCP
+    :param processes: Number of worker processes (default: number of CPUs)
+    :param quiet: Do not log the requests
+    :return: Server object
+    """
+    processes = processes or multiprocessing.cpu_count()
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixGraphServer(socket_path, GraphRequestHandler)
+    else:
+        server = TCPGraphServer((host, port), GraphRequestHandler)
+    server.setup_server(processes, quiet)
+    return server
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def connect(address, timeout=None):
+    """
+    :param address: (host, port) or the path of a Unix domain socket
+    :return: HTTP connection to a graph server (can be reused for several requests)
+    """
+    if isinstance(address, str):
+        return UnixHTTPConnection(address, timeout=timeout)
+    return http.client.HTTPConnection(*address, timeout=timeout)
+
+
+def request_graph(connection, image_bytes, **params):
+    """
+    Client: sends an image to a graph server
+    :param connection: Connection, see connect
+    :param image_bytes: Content of an image file
+    :param params: Parameters, see PARAMETERS
+    :return: Encoded graph (bytes)
+    """
+    connection.request('POST', '/graph?{}'.format(urllib.parse.urlencode(params)), body=image_bytes,
+                       headers={'Content-Type': 'application/octet-stream'})
+    response = connection.getresponse()
+    body = response.read()
+    if response.status != 200:
+        raise RuntimeError('Graph server error {status}: {message}'.format(
+            status=response.status, message=body.decode('utf-8', 'replace')))
+    return body
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class SpatialIndex(object):
+    """
+    KD-tree over node positions for radius and nearest neighbor queries, built in O(n log n)
+    positions: (n, 2) float array, the index of a node is its row
+    """
+
+    def __init__(self, positions):
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        self.tree = cKDTree(self.positions) if len(self.positions) else None
+
+    def __len__(self):
+        return len(self.positions)
+
+    def radius(self, point, radius):
+        """
+        :param point: (x, y) position
+        :param radius: Maximal distance (inclusive)
+        :return: Sorted int array of the nodes within radius of point
+        """
+        if self.tree is None:
+            return np.zeros(0, dtype=np.intp)
+        return np.array(sorted(self.tree.query_ball_point(point, radius)), dtype=np.intp)
+
+    def nearest(self, points, k=1):
+        """
+        :param points: (m, 2) array of (x, y) positions
+        :param k: Number of neighbors per point
+        :return: (distances, indices) with shape (m, k), sorted by distance; missing neighbors (fewer than k nodes)
+                 have distance inf and index len(self)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if self.tree is None:
+            return np.full((len(points), k), np.inf), np.full((len(points), k), 0, dtype=np.intp)
+        distances, indices = self.tree.query(points, k=k)
+        return distances.reshape(len(points), k), indices.reshape(len(points), k).astype(np.intp)
+
+    def pairs(self, radius):
+        """
+        :param radius: Maximal distance (inclusive)
+        :return: (p, 2) int array of all node pairs (i, j) with i < j within radius of each other, sorted
+        """
+        if len(self.positions) < 2:
+            return np.zeros((0, 2), dtype=np.intp)
+        return np.array(sorted(self.tree.query_pairs(radius)), dtype=np.intp).reshape(-1, 2)
@@ -0,0 +1,85 @@
+import os
+import shutil
+
+import pytest
+
+import batch_manager
+import manifest_manager
+
+EXAMPLE_IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'example_images',
+                             'JDoe1.png')
+
+
+def test_incremental_batch_reports_unreadable_input(tmpdir):
+    image = str(tmpdir.join('in', 'a.png'))
+    missing = str(tmpdir.join('in', 'missing.png'))
+    os.makedirs(os.path.dirname(image))
+    shutil.copy(EXAMPLE_IMAGE, image)
+    output_dir = str(tmpdir.join('out'))
+
+    results, summary = batch_manager.process_batch([image, missing], output_dir, processes=1, incremental=True,
+                                                   step_length=10)
+    assert summary['succeeded'] == 1
+    assert summary['failed_files'] == [missing]
+    assert os.path.exists(os.path.join(output_dir, 'a.png.gxl'))
+    assert 'missing.png' in [result for result in results if result['error']][0]['error']
+
+    # The readable image is skipped in the next run, the missing one fails again
+    _, summary = batch_manager.process_batch([image, missing], output_dir, processes=1, incremental=True,
+                                             step_length=10)
+    assert summary['skipped_files'] == [image]
+    assert summary['failed_files'] == [missing]
+
+
+def test_incremental_batch_ignores_low_memory(tmpdir):
+    image = str(tmpdir.join('a.png'))
+    shutil.copy(EXAMPLE_IMAGE, image)
+    output_dir = str(tmpdir.join('out'))
+
+    batch_manager.process_batch([image], output_dir, processes=1, incremental=True, step_length=10)
+    _, summary = batch_manager.process_batch([image], output_dir, processes=1, incremental=True, step_length=10,
+                                             low_memory=True)
+    assert summary['images'] == 0
+    assert summary['skipped_files'] == [image]
+
+
+def test_incremental_batch_keeps_output_names(tmpdir):
+    # Inputs in two sibling directories: deleting one of them must not move the output of the other
+    image_x = str(tmpdir.join('in', 'x', 'a.png'))
+    image_y = str(tmpdir.join('in', 'y', 'b.png'))
+    for image in (image_x, image_y):
+        os.makedirs(os.path.dirname(image))
+        shutil.copy(EXAMPLE_IMAGE, image)
+    output_dir = str(tmpdir.join('out'))
+
+    batch_manager.process_batch([image_x, image_y], output_dir, processes=1, incremental=True, step_length=10)
+    assert sorted(manifest_manager.load_manifest(output_dir)[0]) == ['x/a.png.gxl', 'y/b.png.gxl']
+
+    os.remove(image_y)
+    _, summary = batch_manager.process_batch([image_x], output_dir, processes=1, incremental=True, step_length=10)
+    assert summary['images'] == 0
+    assert summary['skipped_files'] == [image_x]
+    assert summary['removed_files'] == [image_y]
+    assert sorted(manifest_manager.load_manifest(output_dir)[0]) == ['x/a.png.gxl']
+    assert os.path.exists(os.path.join(output_dir, 'x', 'a.png.gxl'))
+    assert not os.path.exists(os.path.join(output_dir, 'y', 'b.png.gxl'))
+    assert not os.path.exists(os.path.join(output_dir, 'a.png.gxl'))
+
+
+def test_incremental_batch_refuses_another_root(tmpdir):
+    image = str(tmpdir.join('in', 'x', 'a.png'))
+    os.makedirs(os.path.dirname(image))
+    shutil.copy(EXAMPLE_IMAGE, image)
+    other = str(tmpdir.join('other.png'))
+    shutil.copy(EXAMPLE_IMAGE, other)
+    output_dir = str(tmpdir.join('out'))
+
+    batch_manager.process_batch([image], output_dir, processes=1, incremental=True, root=str(tmpdir.join('in')),
+                                step_length=10)
+    assert os.path.exists(os.path.join(output_dir, 'x', 'a.png.gxl'))
+
+    with pytest.raises(ValueError):
+        batch_manager.process_batch([image], output_dir, processes=1, incremental=True, root=str(tmpdir),
+                                    step_length=10)
+    with pytest.raises(ValueError):
+        batch_manager.process_batch([image, other], output_dir, processes=1, incremental=True, step_length=10)
@@ -0,0 +1,54 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+import scipy.ndimage
+import skimage.io
+
+import binarize_manager
+
+EXAMPLE_IMAGES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                               'example_images', '*.png')))
+
+# Maximal fraction of the binary pixels in which a backend may differ from blur='exact'
+MAX_DIFFERENCE = {'fft': 0.0001, 'box': 0.001}
+
+
+@pytest.mark.parametrize('blur', sorted(MAX_DIFFERENCE))
+@pytest.mark.parametrize('path', EXAMPLE_IMAGES, ids=os.path.basename)
+def test_blur_backend_close_to_exact(path, blur):
+    img = skimage.io.imread(path, as_grey=True)
+    exact = binarize_manager.img_to_binary(img, sigma1=1, sigma2=30, threshold=0.87)
+    binary_image = binarize_manager.img_to_binary(img, sigma1=1, sigma2=30, threshold=0.87, blur=blur)
+
+    assert binary_image.shape == exact.shape
+    assert np.count_nonzero(binary_image != exact) <= MAX_DIFFERENCE[blur] * exact.size
+
+
+@pytest.mark.parametrize('passes', [1, 2, 3, 4, 6])
+@pytest.mark.parametrize('sigma', [3, 10, 30])
+def test_box_widths_approximate_gaussian_variance(sigma, passes):
+    widths = binarize_manager.box_widths(sigma, passes)
+
+    assert len(widths) == passes
+    assert all(width % 2 == 1 for width in widths)
+    # The variance of a box of width w is (w^2 - 1) / 12, the variances of the passes add up
+    variance = sum((width * width - 1) / 12.0 for width in widths)
+    assert abs(np.sqrt(variance) - sigma) < 0.1 * sigma
+
+
+def test_box_passes_must_be_positive():
+    with pytest.raises(ValueError):
+        binarize_manager.gaussian_blur(np.ones((20, 20)), 5, blur='box', passes=0)
+
+
+@pytest.mark.parametrize('in_place', [False, True])
+@pytest.mark.parametrize('band_rows', [7, 64, 1000])
+def test_fft_blur_into_bands(band_rows, in_place):
+    img = np.random.RandomState(0).uniform(0, 1, (150, 90)).astype(np.float32)
+    exact = scipy.ndimage.gaussian_filter(img.astype(np.float64), 5, mode='nearest', truncate=4.0)
+
+    out = img.copy() if in_place else np.empty_like(img)
+    binarize_manager.fft_blur_into(out if in_place else img, out, 5, band_rows=band_rows)
+    assert np.allclose(out, exact, atol=1e-6)
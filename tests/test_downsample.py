@@ -0,0 +1,43 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+import skimage.io
+
+import graph_manager
+import run
+
+EXAMPLE_IMAGES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                               'example_images', '*.png')))
+
+
+def test_scale_paths_clipped_to_image():
+    # 101 x 103 pixels at factor 3: the last block row and column are only one pixel wide
+    paths = graph_manager.scale_paths([[(0, 0), (33, 34)]], 3, (101, 103))
+    assert paths == [[(1, 1), (100, 102)]]
+
+
+@pytest.mark.parametrize('factor', [2, 3, 4])
+def test_downsampled_nodes_inside_image(factor):
+    img = skimage.io.imread(EXAMPLE_IMAGES[0], as_grey=True)
+    # Crop to a size that is not a multiple of the factor, with ink up to the border
+    height, width = img.shape[0] // factor * factor - 1, img.shape[1] // factor * factor - 2
+    img = img[:height, :width]
+    img[:, -1] = img[-1, :] = img.min()
+
+    _, graph = run.image_to_graph(img, step_length=10, downsample=factor)
+    xs, ys = graph.positions.T
+    assert graph.number_of_nodes() > 0
+    assert 0 <= xs.min() and xs.max() <= width - 1
+    assert 0 <= ys.min() and ys.max() <= height - 1
+
+
+@pytest.mark.parametrize('path', EXAMPLE_IMAGES[:3], ids=os.path.basename)
+def test_step_lengths_with_downsample(path):
+    _, _, _, all_paths, graphs = run.create_graphs_for_step_lengths(path, [10, 25], downsample=2)
+    for step_length, list_of_paths, graph in zip([10, 25], all_paths, graphs):
+        _, _, _, reference_paths, reference = run.create_graph_example(path, step_length=step_length, downsample=2)
+        assert list_of_paths == reference_paths
+        assert np.array_equal(graph.positions, reference.positions)
+        assert np.array_equal(graph.edges, reference.edges)
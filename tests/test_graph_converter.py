@@ -0,0 +1,43 @@
+import io
+
+import numpy as np
+import pytest
+
+import graph_converter
+
+
+def random_arrays(num_graphs, seed=0):
+    random = np.random.RandomState(seed)
+    named_arrays = list()
+    for index in range(num_graphs):
+        num_nodes = random.randint(0, 50)
+        positions = random.uniform(0, 1000, (num_nodes, 2))
+        num_edges = random.randint(0, 2 * num_nodes + 1) if num_nodes else 0
+        edges = random.randint(0, max(1, num_nodes), (num_edges, 2))
+        named_arrays.append(('graph{}.png'.format(index), positions, edges))
+    return named_arrays
+
+
+@pytest.mark.parametrize('num_graphs', [0, 1, 25])
+def test_dataset_file_writer_equals_dump(tmpdir, num_graphs):
+    named_arrays = random_arrays(num_graphs)
+    outfile = str(tmpdir.join('graphs.skg'))
+
+    writer = graph_converter.DatasetFileWriter(outfile)
+    for name, positions, edges in named_arrays:
+        writer.add(name, positions, edges)
+    writer.close()
+
+    f = io.BytesIO()
+    graph_converter.dump_array_dataset(f, named_arrays)
+    with open(outfile, 'rb') as written:
+        assert written.read() == f.getvalue()
+    # Only the dataset file is left, the spool files are removed
+    assert tmpdir.listdir() == [tmpdir.join('graphs.skg')]
+
+    dataset = graph_converter.open_dataset(outfile)
+    assert dataset.names == [name for name, _, _ in named_arrays]
+    for index, (name, positions, edges) in enumerate(named_arrays):
+        _, dataset_positions, dataset_edges = graph_converter.dataset_arrays(dataset, index)
+        assert np.array_equal(dataset_positions, positions.astype(np.float32))
+        assert np.array_equal(dataset_edges, edges)
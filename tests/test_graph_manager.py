@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import skimage.draw
+
+import graph_manager
+import run
+
+
+def stroke_image(shape=(100, 400)):
+    img = np.ones(shape)
+    rr, cc = skimage.draw.polygon([48, 48, 52, 52], [20, 380, 380, 20])
+    img[rr, cc] = 0
+    return img
+
+
+def test_sampled_path_keeps_nodes():
+    path = [(50, x) for x in range(0, 400, 10)]
+    graph = graph_manager.create_keypoint_graph_from_paths([path], merge_radius=9.9, step_length=10)
+
+    assert graph.number_of_nodes() == len(path)
+    assert graph.number_of_edges() == len(path) - 1
+
+
+def test_sampled_straight_stroke_keeps_nodes():
+    _, reference = run.image_to_graph(stroke_image(), step_length=10)
+    _, graph = run.image_to_graph(stroke_image(), step_length=10, merge_radius=5)
+
+    assert reference.number_of_nodes() > 10
+    assert np.array_equal(graph.positions, reference.positions)
+    assert np.array_equal(graph.edges, reference.edges)
+
+
+def test_merged_nodes_stay_within_radius():
+    # A stroke sampled at every pixel: all nodes are chained by close pairs, but must not collapse into one node
+    path = [(50, x) for x in range(100)]
+    graph = graph_manager.create_keypoint_graph_from_paths([path])
+    merged = graph_manager.merge_close_nodes(graph, 1.5)
+
+    distances = np.abs(graph.positions[:, 0][:, np.newaxis] - merged.positions[:, 0][np.newaxis, :])
+    assert distances.min(axis=1).max() <= 1.5
+    assert merged.number_of_nodes() >= 100 // 3
+    assert merged.number_of_edges() == merged.number_of_nodes() - 1
+
+
+def test_end_point_merged_into_junction():
+    paths = [[(50, 10), (50, 50)], [(50, 50), (10, 50)], [(50, 50), (90, 50)], [(51, 50), (51, 90)]]
+    graph = graph_manager.create_keypoint_graph_from_paths(paths, merge_radius=1.5, step_length=10)
+
+    assert graph.number_of_nodes() == 5
+    assert graph.number_of_edges() == 4
+    assert [50, 50] in graph.positions.tolist()
+    assert [50, 51] not in graph.positions.tolist()
+
+
+@pytest.mark.parametrize('merge_radius', [10, 12.5, -1])
+def test_merge_radius_checked_against_step_length(merge_radius):
+    with pytest.raises(ValueError, match='merge_radius must be'):
+        graph_manager.create_keypoint_graph_from_paths([[(0, 0), (0, 10)]], merge_radius=merge_radius,
+                                                       step_length=10)
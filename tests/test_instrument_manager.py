@@ -0,0 +1,32 @@
+import tracemalloc
+
+import numpy as np
+
+import instrument_manager
+
+
+def measure_stage(instrument):
+    with instrument_manager.measure(instrument, 'stage', image='a.png') as stage:
+        tracing = tracemalloc.is_tracing()
+        ones = np.ones(1 << 20, dtype=np.uint8)
+        stage.add_counts(lambda: {'ones': np.count_nonzero(ones)})
+    return tracing
+
+
+def test_memory_not_traced_by_default():
+    records = list()
+    assert not measure_stage(records.append)
+
+    assert len(records) == 1
+    assert records[0]['stage'] == 'stage'
+    assert records[0]['image'] == 'a.png'
+    assert records[0]['ones'] == 1 << 20
+    assert records[0]['peak_bytes'] is None
+
+
+def test_with_peak_memory():
+    records = list()
+    assert measure_stage(instrument_manager.with_peak_memory(records.append))
+
+    assert not tracemalloc.is_tracing()
+    assert records[0]['peak_bytes'] >= 1 << 20
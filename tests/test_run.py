@@ -0,0 +1,37 @@
+import multiprocessing
+import os
+
+import pytest
+
+import graph_manager
+import run
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE_IMAGE = os.path.join(REPO_DIR, 'example_images', 'JDoe1.png')
+EXAMPLE_OUTPUT = os.path.join(REPO_DIR, 'example_output', 'JDoe1.png.gxl')
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_example_output_unchanged(tmpdir, jobs):
+    # The parameters of run.py; the graph id is the name of the output file
+    outfile = str(tmpdir.join('JDoe1.png.gxl'))
+    pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+    try:
+        _, _, _, list_of_paths, graph = run.create_graph_example(EXAMPLE_IMAGE, sigma1=1, sigma2=30, threshold=0.87,
+                                                                 step_length=10, pool=pool)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    graph_manager.write_graph_to_gxl(graph=graph, outfile=outfile)
+    assert read_bytes(outfile) == read_bytes(EXAMPLE_OUTPUT)
+
+    # The networkx graphs of the same paths give the same file
+    graph_manager.write_graph_to_gxl(graph=graph.to_networkx(), outfile=outfile)
+    assert read_bytes(outfile) == read_bytes(EXAMPLE_OUTPUT)
+    graph_manager.write_graph_to_gxl(graph=graph_manager.create_graph_from_paths(list_of_paths), outfile=outfile)
+    assert read_bytes(outfile) == read_bytes(EXAMPLE_OUTPUT)
@@ -0,0 +1,34 @@
+import threading
+
+import pytest
+
+import server_manager
+
+
+@pytest.mark.parametrize('query', ['sigma1=0', 'sigma1=-1', 'sigma1=nan', 'sigma2=0', 'sigma2=inf', 'threshold=0',
+                                   'threshold=1.5', 'threshold=-0.5', 'threshold=nan', 'step_length=0', 'passes=0',
+                                   'merge_radius=-1', 'step_length=5&merge_radius=5', 'merge_radius=nan',
+                                   'downsample=0', 'blur=gauss', 'format=svg', 'sigma1=a', 'unknown=1'])
+def test_invalid_parameters(query):
+    with pytest.raises(ValueError):
+        server_manager.parse_parameters(query)
+
+
+def test_parameters():
+    params = server_manager.parse_parameters('sigma1=2&sigma2=20&threshold=1&step_length=5')
+    assert (params['sigma1'], params['sigma2'], params['threshold'], params['step_length']) == (2.0, 20.0, 1.0, 5)
+    assert params['format'] == 'gxl'
+
+
+def test_invalid_parameters_give_bad_request():
+    server = server_manager.create_server(port=0, processes=1, quiet=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        connection = server_manager.connect(server.server_address, timeout=10)
+        with pytest.raises(RuntimeError, match='Graph server error 400: threshold must be'):
+            server_manager.request_graph(connection, b'image', threshold=2)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
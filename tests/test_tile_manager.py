@@ -0,0 +1,63 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+import skimage.io
+
+import instrument_manager
+import run
+import tile_manager
+
+EXAMPLE_IMAGES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                               'example_images', '*.png')))
+
+
+def assert_same_graph(graph, reference):
+    assert np.array_equal(graph.positions, reference.positions)
+    assert np.array_equal(graph.edges, reference.edges)
+
+
+@pytest.mark.parametrize('tile_size', [128, 300])
+@pytest.mark.parametrize('path', EXAMPLE_IMAGES, ids=os.path.basename)
+def test_tiled_graph_equals_untiled(path, tile_size):
+    _, _, _, reference_paths, reference = run.create_graph_example(path, step_length=10)
+    _, _, list_of_paths, graph = tile_manager.create_graph_tiled(path, step_length=10, tile_size=tile_size)
+
+    assert len(list_of_paths) == len(reference_paths)
+    for path_points, reference_points in zip(list_of_paths, reference_paths):
+        assert np.array_equal(path_points, reference_points)
+    assert_same_graph(graph, reference)
+
+
+def test_blank_image(tmpdir):
+    path = str(tmpdir.join('blank.png'))
+    skimage.io.imsave(path, np.full((200, 300), 255, dtype=np.uint8))
+
+    _, _, _, _, reference = run.create_graph_example(path, step_length=10)
+    _, (ys, xs), list_of_paths, graph = tile_manager.create_graph_tiled(path, step_length=10, tile_size=128)
+
+    assert len(ys) == len(xs) == 0
+    assert list_of_paths == []
+    assert graph.number_of_nodes() == reference.number_of_nodes() == 0
+    assert graph.number_of_edges() == reference.number_of_edges() == 0
+
+
+def test_peak_memory_bounded_by_tile_size(tmpdir):
+    # Colour page with horizontal strokes, decoded as uint8 and converted to grey per tile
+    size, tile_size = 1200, 128
+    page = np.full((size, size, 3), 255, dtype=np.uint8)
+    for y in range(50, size - 50, 100):
+        page[y:y + 4, 20:size - 20] = 0
+    path = str(tmpdir.join('page.png'))
+    skimage.io.imsave(path, page)
+
+    records = list()
+    tile_manager.create_graph_tiled(path, step_length=10, blur='box', tile_size=tile_size,
+                                    instrument=instrument_manager.with_peak_memory(records.append))
+    peak_bytes = {record['stage']: record['peak_bytes'] for record in records}
+
+    # A grey float64 page, as imread(as_grey=True) decoded it, alone would take size * size * 8 bytes
+    assert peak_bytes['imread'] < size * size * 8
+    window_bytes = (tile_size + 2 * tile_manager.tile_margin(1, 30, blur='box')) ** 2 * 8
+    assert peak_bytes['tiled_skeleton'] < 8 * window_bytes
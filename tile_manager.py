@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+import skimage.color
+import skimage.io
+
+import binarize_manager
+import graph_manager
+import instrument_manager
+
+# Extra overlap for the skeletonization: the thinning of a stroke near the tile border may depend on pixels up to
+# about the stroke width away, so the binary image must be exact a bit beyond the tile
+SKELETON_MARGIN = 16
+
+# 8-neighbors that come after a pixel in row-major order
+FORWARD_OFFSETS = ((0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def tile_margin(sigma1, sigma2, blur='exact', passes=3, skeleton_margin=SKELETON_MARGIN):
+    """
+    Overlap around every tile, so that the binary image and the skeleton inside the tile are the same as for the
+    whole image: the reach of the wider blur, one pixel for fix_small_holes and the skeleton margin
+    :return: Margin in pixels
+    """
+    blur_radius = max(binarize_manager.blur_radius(sigma1, blur=blur, passes=passes),
+                      binarize_manager.blur_radius(sigma2, blur=blur, passes=passes))
+    return blur_radius + 1 + skeleton_margin
+
+
+def tile_windows(shape, tile_size, margin):
+    """
+    Splits an image into tiles with overlapping windows
+    :param shape: Image shape (height, width)
+    :param tile_size: Edge length of a tile
+    :param margin: Overlap added on every side of a tile (clipped at the image border)
+    :return: Generator of (window, tile), window are the slices of the image to process, tile the slices of the tile
+             within the window
+    """
+    height, width = shape
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            y1, x1 = min(y0 + tile_size, height), min(x0 + tile_size, width)
+            wy0, wx0 = max(y0 - margin, 0), max(x0 - margin, 0)
+            wy1, wx1 = min(y1 + margin, height), min(x1 + margin, width)
+            yield (slice(wy0, wy1), slice(wx0, wx1)), (slice(y0 - wy0, y1 - wy0), slice(x0 - wx0, x1 - wx0))
+
+
+def grey_window(img):
+    """
+    Grey image of a window, as skimage.io.imread(as_grey=True) converts the whole image: grey images are kept, colour
+    images are converted to float (the alpha channel is ignored)
+    """
+    if img.ndim > 2:
+        return skimage.color.rgb2gray(img[..., :3])
+    return img
+
+
+def tiled_skeleton_points(img, sigma1=1, sigma2=30, threshold=0.87, blur='exact', passes=3, tile_size=1024,
+                          skeleton_margin=SKELETON_MARGIN, workspace=None):
+    """
+    Binarizes and skeletonizes an image tile by tile. Only the windows of one tile are held as float images at a time
+    (colour images are converted to grey per window, see grey_window); the skeleton is collected as pixel coordinates.
+    :param img: Image object as decoded, e.g. uint8 grey or RGB(A)
+    :param tile_size: Edge length of a tile
+    :param skeleton_margin: Overlap for the skeletonization, see SKELETON_MARGIN
+    :param workspace: binarize_manager.Workspace for the low-memory mode, its buffers are reused for every tile
+    :return: Coordinate arrays (ys, xs) of the skeleton pixels in row-major order
+    """
+    margin = tile_margin(sigma1, sigma2, blur=blur, passes=passes, skeleton_margin=skeleton_margin)
+
+    all_ys = list()
+    all_xs = list()
+    for window, tile in tile_windows(img.shape[:2], tile_size, margin):
+        binary_image = binarize_manager.fix_small_holes(
+            binarize_manager.img_to_binary(grey_window(img[window]), sigma1=sigma1, sigma2=sigma2, threshold=threshold,
+                                           blur=blur, passes=passes, workspace=workspace), in_place=workspace is not None)
+        skeleton = binarize_manager.binary_to_skeleton(binary_image, low_memory=workspace is not None)
+        ys, xs = np.nonzero(skeleton[tile] == 0)
+        all_ys.append(ys + (window[0].start + tile[0].start))
+        all_xs.append(xs + (window[1].start + tile[1].start))
+
+    ys = np.concatenate(all_ys).astype(np.intp)
+    xs = np.concatenate(all_xs).astype(np.intp)
+    order = np.lexsort((xs, ys))
+    return ys[order], xs[order]
+
+
+def label_points(ys, xs):
+    """
+    8-connected components of a set of pixels, without an image of the full size
+    :param ys: y coordinates in row-major order
+    :param xs: x coordinates
+    :return: (number of components, component label of every pixel)
+    """
+    num_points = len(ys)
+    if num_points == 0:
+        return 0, np.zeros(0, dtype=np.int32)
+
+    # One spare column, so that neighbors left of x = 0 and right of the last column never wrap to another row
+    width = int(xs.max()) + 2
+    index = ys.astype(np.int64) * width + xs
+
+    rows = list()
+    cols = list()
+    for dy, dx in FORWARD_OFFSETS:
+        target = index + (dy * width + dx)
+        position = np.searchsorted(index, target)
+        found = position < num_points
+        found[found] = index[position[found]] == target[found]
+        rows.append(np.flatnonzero(found))
+        cols.append(position[found])
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+
+    adjacency = scipy.sparse.coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                                        shape=(num_points, num_points))
+    return scipy.sparse.csgraph.connected_components(adjacency, directed=False)
+
+
+def points_to_chains(ys, xs, pool=None):
+    """
+    Traces a skeleton given as pixel coordinates. Every connected component is traced in a crop of its bounding box,
+    the chains are merged in the order of graph_manager.skeleton_to_chains for the whole skeleton.
+    :param ys: y coordinates of the skeleton pixels in row-major order
+    :param xs: x coordinates
+    :param pool: Trace the components in this pool, see graph_manager.trace_components
+    :return: graph_manager.SkeletonChains
+    """
+    num, labels = label_points(ys, xs)
+    if num == 0:
+        # Blank image: no components to trace
+        return graph_manager.merge_chains(list())
+
+    order = np.argsort(labels, kind='mergesort')
+    bounds = np.cumsum(np.bincount(labels, minlength=num))[:-1]
+
+    components = list()
+    for component_ys, component_xs in zip(np.split(ys[order], bounds), np.split(xs[order], bounds)):
+        # Even crop offsets, see graph_manager.skeleton_components
+        y0, x0 = int(component_ys.min()) & ~1, int(component_xs.min()) & ~1
+        crop = np.ones((int(component_ys.max()) - y0 + 1, int(component_xs.max()) - x0 + 1), dtype=np.uint8)
+        crop[component_ys - y0, component_xs - x0] = 0
+        components.append((y0, x0, crop))
+
+    return graph_manager.trace_components(components, pool=pool)
+
+
+def points_to_skeleton(ys, xs, shape):
+    """Skeleton image (0 = black/skeleton, 1 = white) of the pixel coordinates, e.g. for display"""
+    skeleton = np.ones(shape, dtype=np.uint8)
+    skeleton[ys, xs] = 0
+    return skeleton
+
+
+def create_graph_tiled(path_img, sigma1=1, sigma2=30, threshold=0.87, step_length=25, blur='exact', tile_size=1024,
+                       skeleton_margin=SKELETON_MARGIN, instrument=None, workspace=None, merge_radius=0, pool=None,
+                       passes=3):
+    """
+    Tiled version of run.create_graph_example for large images: gives the same paths and graph, but the float images
+    of the binarization and skeletonization are only held for one tile at a time. The image is kept as decoded
+    (uint8 for most scans) and converted to grey float per tile, so besides the decoded image and the skeleton pixel
+    coordinates, the memory is bounded by the tile size.
+    :param instrument: Function called with a record (wall time, peak memory, counts) per stage, see instrument_manager
+    :param workspace: binarize_manager.Workspace for the low-memory mode
+    :param merge_radius: Merge nodes within this distance, see graph_manager.merge_close_nodes (0 = no merge)
+    :param pool: Trace the connected components in this pool, see graph_manager.trace_components
+    :return: (img as decoded, skeleton pixel coordinates (ys, xs), list_of_paths, graph), graph is a KeypointGraph
+    """
+    with instrument_manager.measure(instrument, 'imread') as stage:
+        with open(path_img, "rb") as f_in:
+            img = skimage.io.imread(f_in)
+        stage.add_counts(lambda: {'pixels': img.shape[0] * img.shape[1]})
+
+    with instrument_manager.measure(instrument, 'tiled_skeleton', tile_size=tile_size) as stage:
+        ys, xs = tiled_skeleton_points(img, sigma1=sigma1, sigma2=sigma2, threshold=threshold, blur=blur,
+                                       passes=passes, tile_size=tile_size, skeleton_margin=skeleton_margin,
+                                       workspace=workspace)
+        stage.add_counts(lambda: {'skeleton_pixels': len(ys)})
+
+    with instrument_manager.measure(instrument, 'paths') as stage:
+        list_of_paths = graph_manager.chains_to_paths(points_to_chains(ys, xs, pool=pool), step_length)
+        stage.add_counts(instrument_manager.paths_counts, list_of_paths)
+
+    with instrument_manager.measure(instrument, 'graph') as stage:
+        graph = graph_manager.create_keypoint_graph_from_paths(list_of_paths, merge_radius=merge_radius,
+                                                               step_length=step_length)
+        stage.add_counts(instrument_manager.graph_counts, graph)
+
+    return img, (ys, xs), list_of_paths, graph